@@ -0,0 +1,240 @@
+import argparse
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ORGANISATION = "bench"
+REPOSITORY = "installation"
+TAG = "bench"
+# Bytes written between two bandwidth checks
+THROTTLE_CHUNK = 16 * 1024
+
+
+def build_release(files: int, file_size: int, compressible: bool = False, seed: int = 0) -> bytes:
+	"""
+	Builds a release zip laid out like a GitHub tag archive, with an installation.json that installs everything in app/
+	:param files: amount of files in app/
+	:param file_size: size of every file in bytes
+	:param compressible: repeated text instead of random bytes
+	:param seed: the same seed always builds the same archive
+	"""
+	rng = random.Random(seed)
+	prefix = f"{REPOSITORY}-{TAG}/"
+	buffer = io.BytesIO()
+	with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+		archive.writestr(prefix + "installation.json", json.dumps({"libs": [], "content": ["app/"]}))
+		for i in range(files):
+			if compressible:
+				data = (f"line {i}\n" * (file_size // 7 + 1)).encode()[:file_size]
+			else:
+				data = rng.randbytes(file_size)
+			archive.writestr(f"{prefix}app/{i // 100:03}/file-{i:05}.bin", data)
+	return buffer.getvalue()
+
+
+class Backend:
+	"""
+	Stand-in for the account server and GitHub, serving the account endpoints and one release zip on localhost.
+	Every response waits latency seconds first and bodies are sent at no more than bandwidth bytes per second.
+	"""
+
+	def __init__(self, release: bytes, latency: float = 0.0, bandwidth: float | None = None, publish_digest: bool = True):
+		"""
+		:param publish_digest: list the release's SHA-256 in the channel manifest
+		"""
+		self.release = release
+		self.sha256 = hashlib.sha256(release).hexdigest()
+		self.etag = '"' + self.sha256[:16] + '"'
+		self.publish_digest = publish_digest
+		self.latency = latency
+		self.bandwidth = bandwidth
+		self.requests = 0
+		self.lock = threading.Lock()
+		self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+		self.server.daemon_threads = True
+		self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+	@property
+	def base_url(self) -> str:
+		return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+	def urls(self) -> dict[str, str]:
+		"""
+		:return: the InstallEngine URL options pointing at this backend
+		"""
+		account = self.base_url + "/crystal/"
+		return {
+			"check_url": account + "register/validate?username=%username%&password=%password%",
+			"register_url": account + "register?username=%username%&password=%password%",
+			"login_url": account + "login?username=%username%&password=%password%",
+			"channels_url": self.base_url + "/channels.json"
+		}
+
+	@property
+	def download_url(self) -> str:
+		return f"{self.base_url}/{ORGANISATION}/{REPOSITORY}/archive/refs/tags/{TAG}.zip"
+
+	def manifest(self) -> bytes:
+		release = {
+			"version": TAG,
+			"url": self.download_url,
+			"folder": f"{REPOSITORY}-{TAG}",
+			"format": "zip",
+			"size": len(self.release),
+			"sha256": self.sha256 if self.publish_digest else None
+		}
+		return json.dumps({"channels": {"stable": [release], "beta": []}}).encode()
+
+	@property
+	def user_url(self) -> str:
+		return self.base_url + "/crystal/get/"
+
+	def start(self):
+		self.thread.start()
+
+	def stop(self):
+		self.server.shutdown()
+		self.server.server_close()
+
+	def __enter__(self):
+		self.start()
+		return self
+
+	def __exit__(self, *args):
+		self.stop()
+
+	def handler(self):
+		backend = self
+
+		class Handler(BaseHTTPRequestHandler):
+			protocol_version = "HTTP/1.1"
+
+			def log_message(self, format, *args):
+				pass
+
+			def do_HEAD(self):
+				self.respond(head=True)
+
+			def do_GET(self):
+				self.respond(head=False)
+
+			def respond(self, head: bool):
+				with backend.lock:
+					backend.requests += 1
+				if backend.latency:
+					time.sleep(backend.latency)
+
+				url = urlparse(self.path)
+				query = {key: values[0] for key, values in parse_qs(url.query).items()}
+				if url.path.endswith(".zip"):
+					self.send_release(head)
+				elif url.path == "/channels.json":
+					self.send_manifest(head)
+				elif url.path in ("/crystal/register/validate", "/crystal/register", "/crystal/login"):
+					reply = {"state": "success"}
+					if url.path != "/crystal/register/validate":
+						reply["token"] = hashlib.sha256(query.get("username", "").encode()).hexdigest()
+					self.send_body(200, json.dumps(reply).encode(), "application/json", head)
+				elif url.path.startswith("/crystal/get/"):
+					username = url.path.rsplit("/", 1)[1]
+					self.send_body(200, json.dumps({"data": {"username": username}}).encode(), "application/json", head)
+				else:
+					self.send_body(404, b"Not found", "text/plain", head)
+
+			def send_release(self, head: bool):
+				data = backend.release
+				start, end = 0, len(data) - 1
+				status = 200
+				range_header = self.headers.get("Range")
+				if_range = self.headers.get("If-Range")
+				if range_header and range_header.startswith("bytes=") and if_range in (None, backend.etag):
+					first, _, last = range_header[6:].partition("-")
+					start = int(first)
+					end = min(int(last), end) if last else end
+					if start > end:
+						self.send_response(416)
+						self.send_header("Content-Range", f"bytes */{len(data)}")
+						self.send_header("Content-Length", "0")
+						self.end_headers()
+						return
+					status = 206
+
+				self.send_response(status)
+				self.send_header("Content-Type", "application/zip")
+				self.send_header("Content-Length", str(end - start + 1))
+				self.send_header("Accept-Ranges", "bytes")
+				self.send_header("ETag", backend.etag)
+				if status == 206:
+					self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+				self.end_headers()
+				if not head:
+					self.write_throttled(memoryview(data)[start:end + 1])
+
+			def send_manifest(self, head: bool):
+				manifest = backend.manifest()
+				etag = '"' + hashlib.sha256(manifest).hexdigest()[:16] + '"'
+				if self.headers.get("If-None-Match") == etag:
+					self.send_response(304)
+					self.send_header("ETag", etag)
+					self.send_header("Content-Length", "0")
+					self.end_headers()
+					return
+				self.send_body(200, manifest, "application/json", head, {"ETag": etag})
+
+			def send_body(self, status: int, body: bytes, content_type: str, head: bool, headers: dict | None = None):
+				self.send_response(status)
+				for name, value in (headers or {}).items():
+					self.send_header(name, value)
+				self.send_header("Content-Type", content_type)
+				self.send_header("Content-Length", str(len(body)))
+				self.end_headers()
+				if not head:
+					self.write_throttled(memoryview(body))
+
+			def write_throttled(self, body: memoryview):
+				# The bandwidth is read again for every chunk, so it can be changed while a response is sent
+				due = time.monotonic()
+				for offset in range(0, len(body), THROTTLE_CHUNK):
+					try:
+						self.wfile.write(body[offset:offset + THROTTLE_CHUNK])
+					except (BrokenPipeError, ConnectionResetError):
+						# The installer gave up on the response, e.g. to switch mirrors
+						self.close_connection = True
+						return
+					if backend.bandwidth:
+						due = max(due + THROTTLE_CHUNK / backend.bandwidth, time.monotonic() - 1)
+						ahead = due - time.monotonic()
+						if ahead > 0:
+							time.sleep(ahead)
+
+		return Handler
+
+
+def main():
+	"""
+	Serves a release until interrupted, handy for trying the installer UI against the stand-in
+	"""
+	parser = argparse.ArgumentParser(description="Stand-in backend for benchmarking the installer")
+	parser.add_argument("--files", type=int, default=100)
+	parser.add_argument("--file-size", type=int, default=64 * 1024)
+	parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+	parser.add_argument("--bandwidth", type=float, default=None, help="bytes per second per response")
+	args = parser.parse_args()
+
+	with Backend(build_release(args.files, args.file_size), args.latency, args.bandwidth) as backend:
+		print(json.dumps({**backend.urls(), "user_url": backend.user_url}, indent=4))
+		try:
+			while True:
+				time.sleep(1)
+		except KeyboardInterrupt:
+			pass
+
+
+if __name__ == "__main__":
+	main()
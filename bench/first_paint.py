@@ -0,0 +1,106 @@
+"""
+Measures how long the setup wizard takes until it is first painted, every run in a fresh process. Runs offscreen, so it
+works without a display. Run from the repository root:
+
+	python -m bench.first_paint --runs 21 --output after.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+RUNS = 11
+
+
+def measure(result_path: str):
+	"""
+	Starts the wizard in this process and writes its timings as JSON to result_path once the window has been painted
+	"""
+	started = time.perf_counter()
+	from PyQt6.QtCore import QEvent, QObject
+	from PyQt6.QtWidgets import QApplication
+
+	import installer.main as wizard
+	imported = time.perf_counter()
+
+	if sys.platform not in ["darwin", "win32"]:
+		# The "unsupported operating system" dialog is modal and would block the measurement
+		wizard.QErrorDialog = lambda message="", title="": print(f"Skipped dialog: {message}", file=sys.stderr)
+
+	# Startup checks run in the background, without a network they'd quit the installer before it is painted
+	wizard.is_wifi_on = lambda: True
+
+	result = {"import_ms": (imported - started) * 1000}
+
+	class PaintFilter(QObject):
+		def eventFilter(self, obj, event):
+			if event.type() == QEvent.Type.Paint and isinstance(obj, wizard.Window):
+				painted = time.perf_counter()
+				result["first_paint_ms"] = (painted - app_created) * 1000
+				result["total_ms"] = (painted - started) * 1000
+				# Not printed, the wizard's threads print at the same time
+				with open(result_path, "w") as f:
+					json.dump(result, f)
+				# Background threads (startup checks) don't have to finish
+				os._exit(0)
+			return False
+
+	app = QApplication(sys.argv[:1])
+	app_created = time.perf_counter()
+	paint_filter = PaintFilter()
+	app.installEventFilter(paint_filter)
+
+	window = wizard.Window(app)
+	result["window_ms"] = (time.perf_counter() - app_created) * 1000
+	window.show()
+	app.exec()
+
+
+def median(values: list[float]) -> float:
+	values = sorted(values)
+	middle = len(values) // 2
+	return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+
+def main(argv: list[str] | None = None) -> int:
+	parser = argparse.ArgumentParser(description="Measures the time until the setup wizard is first painted")
+	parser.add_argument("--runs", type=int, default=RUNS)
+	parser.add_argument("--output", default=None, help="write the results as JSON")
+	parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+	args = parser.parse_args(argv)
+
+	if args.child is not None:
+		measure(args.child)
+		return 1
+
+	env = {**os.environ, "QT_QPA_PLATFORM": os.environ.get("QT_QPA_PLATFORM", "offscreen")}
+	runs = []
+	with tempfile.TemporaryDirectory() as folder:
+		result_path = os.path.join(folder, "result.json")
+		for i in range(args.runs):
+			process = subprocess.run(
+				[sys.executable, "-m", "bench.first_paint", "--child", result_path], env=env, capture_output=True,
+				text=True, timeout=60
+			)
+			if not os.path.exists(result_path):
+				raise RuntimeError(f"Run {i + 1} didn't paint the wizard:\n{process.stdout}{process.stderr}")
+			with open(result_path, "r") as f:
+				runs.append(json.load(f))
+			os.remove(result_path)
+
+	summary = {name: median([run[name] for run in runs]) for name in runs[0]}
+	print(
+		f"Median of {len(runs)} runs: import {summary['import_ms']:.1f} ms, window {summary['window_ms']:.1f} ms, "
+		f"first paint {summary['first_paint_ms']:.1f} ms after QApplication, {summary['total_ms']:.1f} ms in total"
+	)
+	if args.output is not None:
+		with open(args.output, "w") as f:
+			json.dump({"runs": runs, "summary": summary}, f, indent=4)
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,244 @@
+"""
+Benchmarks a full install against the local stand-in backend in bench/backend.py, so installer performance can be
+measured without snackbag.net or GitHub. Run from the repository root:
+
+	python -m bench.install_bench --files 500 --file-size 65536 --latency 0.05 --bandwidth 5000000 --output before.json
+	python -m bench.install_bench ... --output after.json --compare before.json
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench.backend import Backend, build_release
+
+RUNS = 3
+USERNAME = "bench"
+PASSWORD = "bench"
+
+
+def peak_rss() -> int | None:
+	"""
+	:return: peak resident set size of this process in bytes, None where the OS doesn't tell (Windows)
+	"""
+	try:
+		import resource
+	except ImportError:
+		return None
+
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# Linux reports KiB, macOS bytes
+	return peak if sys.platform == "darwin" else peak * 1024
+
+
+def written_bytes() -> int | None:
+	"""
+	:return: bytes this process caused to be written to storage, None where the OS doesn't tell. Unlike wchar, this
+		leaves out sockets and pipes and includes copy_file_range/sendfile copies.
+	"""
+	try:
+		with open("/proc/self/io", "r") as f:
+			for line in f:
+				if line.startswith("write_bytes:"):
+					return int(line.split()[1])
+	except OSError:
+		pass
+	return None
+
+
+def folder_size(folder: Path) -> int:
+	size = 0
+	for root, _, names in os.walk(folder):
+		size += sum(os.path.getsize(os.path.join(root, name)) for name in names)
+	return size
+
+
+def run_install(urls: dict, user_url: str, work_folder: str, options: dict, verbose: bool, results):
+	"""
+	Runs one install in a fresh process, so peak RSS and written bytes only cover that install
+	"""
+	from installer.engine import InstallEngine, lookup_username
+
+	work_folder = Path(work_folder)
+	save_folder = work_folder / "save"
+	install_folder = work_folder / "install"
+	save_folder.mkdir(parents=True, exist_ok=True)
+	written = written_bytes()
+
+	output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+	started = time.perf_counter()
+	with output:
+		username = lookup_username(USERNAME, user_url)
+		engine = InstallEngine(
+			False,
+			save_folder,
+			work_folder / "projects",
+			username,
+			PASSWORD,
+			install_folder=install_folder,
+			staging=work_folder / "staging",
+			**urls,
+			**options
+		)
+		engine.run()
+	wall = time.perf_counter() - started
+
+	written_after = written_bytes()
+	results.put({
+		"wall_seconds": wall,
+		"stages": engine.tracer.durations(),
+		"peak_rss_bytes": peak_rss(),
+		"bytes_written": written_after - written if written is not None else None,
+		"installed_bytes": folder_size(install_folder)
+	})
+
+
+def bench(args) -> dict:
+	release = build_release(args.files, args.file_size, args.compressible)
+	context = multiprocessing.get_context("spawn")
+	options = {"segments": args.segments, "stream_extract": not args.no_stream_extract}
+	runs = []
+
+	with Backend(release, args.latency, args.bandwidth, not args.no_verify) as backend:
+		work_folder = Path(tempfile.mkdtemp(prefix="crystal-bench-"))
+		try:
+			for i in range(args.runs):
+				if not args.warm:
+					# Start every run without the archive cache and stage times of the previous one
+					shutil.rmtree(work_folder, ignore_errors=True)
+
+				results = context.Queue()
+				process = context.Process(
+					target=run_install,
+					args=(backend.urls(), backend.user_url, str(work_folder), options, args.verbose, results)
+				)
+				process.start()
+				process.join()
+				if process.exitcode != 0:
+					raise RuntimeError(f"Run {i + 1} failed with exit code {process.exitcode}")
+
+				run = results.get()
+				runs.append(run)
+				stages = ", ".join(f"{name} {seconds:.3f} s" for name, seconds in run["stages"].items())
+				print(f"Run {i + 1}/{args.runs}: {run['wall_seconds']:.3f} s ({stages})")
+		finally:
+			shutil.rmtree(work_folder, ignore_errors=True)
+
+	return {
+		"commit": git_commit(),
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"created_at": time.time(),
+		"scenario": {
+			"files": args.files,
+			"file_size": args.file_size,
+			"release_bytes": len(release),
+			"compressible": args.compressible,
+			"latency": args.latency,
+			"bandwidth": args.bandwidth,
+			"warm": args.warm,
+			"verify": not args.no_verify,
+			**options
+		},
+		"runs": runs,
+		"summary": summarize(runs)
+	}
+
+
+def summarize(runs: list[dict]) -> dict:
+	"""
+	:return: the median of every measurement over all runs
+	"""
+	def median(values: list[float]) -> float | None:
+		values = sorted(value for value in values if value is not None)
+		if not values:
+			return None
+		middle = len(values) // 2
+		return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+	stages = {name for run in runs for name in run["stages"]}
+	return {
+		"wall_seconds": median([run["wall_seconds"] for run in runs]),
+		"stages": {name: median([run["stages"].get(name) for run in runs]) for name in sorted(stages)},
+		"peak_rss_bytes": median([run["peak_rss_bytes"] for run in runs]),
+		"bytes_written": median([run["bytes_written"] for run in runs])
+	}
+
+
+def git_commit() -> str | None:
+	try:
+		return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def compare(before: dict, after: dict):
+	"""
+	Prints how the medians of after differ from before
+	"""
+	def line(name: str, old: float | None, new: float | None):
+		if old is None or new is None:
+			return
+		change = (new - old) / old * 100 if old else 0.0
+		print(f"  {name:<16} {old:>14.3f} -> {new:>14.3f} ({change:+.1f}%)")
+
+	if before["scenario"] != after["scenario"]:
+		print("Warning: the scenarios differ, the comparison might not be meaningful")
+
+	print(f"Comparing {before.get('commit') or 'unknown'} -> {after.get('commit') or 'unknown'}")
+	old, new = before["summary"], after["summary"]
+	line("wall seconds", old["wall_seconds"], new["wall_seconds"])
+	for name in sorted(set(old["stages"]) | set(new["stages"])):
+		line(name, old["stages"].get(name), new["stages"].get(name))
+	if old["peak_rss_bytes"] is not None and new["peak_rss_bytes"] is not None:
+		line("peak RSS MiB", old["peak_rss_bytes"] / 2 ** 20, new["peak_rss_bytes"] / 2 ** 20)
+	if old["bytes_written"] is not None and new["bytes_written"] is not None:
+		line("written MiB", old["bytes_written"] / 2 ** 20, new["bytes_written"] / 2 ** 20)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+	parser = argparse.ArgumentParser(description="Benchmarks a full install against a local stand-in backend")
+	parser.add_argument("--files", type=int, default=200, help="amount of files in the release")
+	parser.add_argument("--file-size", type=int, default=64 * 1024, help="size of every file in bytes")
+	parser.add_argument("--compressible", action="store_true", help="fill files with text instead of random bytes")
+	parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+	parser.add_argument("--bandwidth", type=float, default=None, help="bytes per second per response")
+	parser.add_argument("--runs", type=int, default=RUNS)
+	parser.add_argument("--warm", action="store_true", help="keep the save folder (and its caches) between runs")
+	parser.add_argument("--segments", type=int, default=4)
+	parser.add_argument("--no-stream-extract", action="store_true")
+	parser.add_argument("--no-verify", action="store_true", help="don't publish the release's SHA-256 in the manifest")
+	parser.add_argument("--output", type=Path, default=None, help="write the results as JSON")
+	parser.add_argument("--compare", type=Path, default=None, help="results of an earlier run to compare with")
+	parser.add_argument("--verbose", action="store_true", help="show the installer's output")
+	return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+	args = parse_args(argv)
+	result = bench(args)
+
+	summary = result["summary"]
+	peak = f"{summary['peak_rss_bytes'] / 2 ** 20:.1f} MiB" if summary["peak_rss_bytes"] is not None else "unknown"
+	print(f"Median wall time {summary['wall_seconds']:.3f} s, peak RSS {peak}")
+	if args.output is not None:
+		with open(args.output, "w") as f:
+			json.dump(result, f, indent=4)
+		print(f"Wrote results to {args.output}")
+
+	if args.compare is not None:
+		with open(args.compare, "r") as f:
+			compare(json.load(f), result)
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -1,10 +1,24 @@
-import installer.main
+import sys
 
 
 def run(*args, **kwargs):
 	"""
-	This function only exists to emulate the normal version of CrystalStudio, so not the "installer version"
+	Starts the installer through the same entry point as the normal version of CrystalStudio. The installer is only
+	imported here so importing this module stays cheap.
+	Pass --profile-startup[=path] or set CRYSTAL_PROFILE_STARTUP to write a report of import and startup timings.
+	Pass --headless to install from the command line without Qt, see installer.cli for the other options.
 	:param debug: DOES NOTHING, just to emulate normal CrystalStudio!
 	:return:
 	"""
-	pass
+	if "--headless" in sys.argv:
+		from installer.cli import main
+
+		sys.exit(main([arg for arg in sys.argv[1:] if arg != "--headless"]))
+
+	from installer.profiling import from_args
+
+	profiler = from_args(sys.argv)
+	with profiler.span("import installer.main"):
+		import installer.main
+
+	sys.exit(installer.main.main(profiler=profiler))
@@ -0,0 +1,139 @@
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from installer.integrity import sha256_mapped
+
+MAX_CACHE_SIZE = 2 * 1024 * 1024 * 1024
+
+
+class ArtifactCache:
+	"""
+	Persistent cache for downloaded release archives, shared by every install that uses the same save folder.
+	Files are stored by their SHA-256 and looked up either by that digest or by URL + ETag/Last-Modified.
+	The least recently used archives get evicted once the cache grows past max_size.
+	"""
+
+	def __init__(self, root: Path, max_size: int = MAX_CACHE_SIZE):
+		self.root = Path(root)
+		self.max_size = max_size
+		self.index_path = self.root / "index.json"
+		self.lock = threading.Lock()
+		self.root.mkdir(parents=True, exist_ok=True)
+		self.index = self.load_index()
+
+	def load_index(self) -> dict:
+		try:
+			with open(self.index_path, "r") as f:
+				index = json.load(f)
+		except (OSError, ValueError):
+			index = {}
+
+		index.setdefault("entries", {})
+		index.setdefault("keys", {})
+		index.setdefault("stats", {"hits": 0, "misses": 0, "bytes_saved": 0})
+		return index
+
+	def dump_index(self):
+		# Write to a temporary file first, so a crash never leaves a half-written index behind
+		tmp_path = self.index_path.with_suffix(".tmp")
+		with open(tmp_path, "w") as f:
+			json.dump(self.index, f, indent=4)
+		os.replace(tmp_path, self.index_path)
+
+	@staticmethod
+	def key(url: str, validator: str | None) -> str:
+		return f"{url}#{validator}" if validator else url
+
+	def path_of(self, digest: str) -> Path:
+		return self.root / f"{digest}.zip"
+
+	def lookup(self, url: str, validator: str | None = None) -> Path | None:
+		with self.lock:
+			digest = self.index["keys"].get(self.key(url, validator))
+		if digest is None:
+			self.record_miss()
+			return None
+		return self.lookup_digest(digest)
+
+	def lookup_digest(self, digest: str) -> Path | None:
+		with self.lock:
+			entry = self.index["entries"].get(digest)
+			path = self.path_of(digest)
+			if entry is None or not path.exists():
+				self.index["stats"]["misses"] += 1
+				self.dump_index()
+				return None
+
+			entry["last_used"] = time.time()
+			self.index["stats"]["hits"] += 1
+			self.index["stats"]["bytes_saved"] += entry["size"]
+			self.dump_index()
+			print(f"Cache hit for {digest}")
+			return path
+
+	def discard(self, digest: str):
+		"""
+		Removes a damaged archive from the cache
+		"""
+		with self.lock:
+			self.index["entries"].pop(digest, None)
+			self.index["keys"] = {key: d for key, d in self.index["keys"].items() if d != digest}
+			if self.path_of(digest).exists():
+				os.remove(self.path_of(digest))
+			self.dump_index()
+
+	def record_miss(self):
+		with self.lock:
+			self.index["stats"]["misses"] += 1
+			self.dump_index()
+
+	def store(self, file: Path, url: str | None = None, validator: str | None = None, digest: str | None = None) -> Path:
+		"""
+		Moves file into the cache
+		:param digest: SHA-256 of file, calculated if not given
+		:return: path of the cached file
+		"""
+		digest = digest or sha256_mapped(file)
+		path = self.path_of(digest)
+		size = Path(file).stat().st_size
+
+		with self.lock:
+			if path.exists():
+				os.remove(file)
+			else:
+				shutil.move(file, path)
+
+			self.index["entries"][digest] = {"size": size, "last_used": time.time()}
+			if url is not None:
+				self.index["keys"][self.key(url, validator)] = digest
+
+			self.evict()
+			self.dump_index()
+
+		return path
+
+	def evict(self):
+		entries = self.index["entries"]
+		total = sum(entry["size"] for entry in entries.values())
+		for digest in sorted(entries, key=lambda d: entries[d]["last_used"]):
+			# Always keep the most recently used archive, even if it alone is bigger than max_size
+			if total <= self.max_size or len(entries) <= 1:
+				break
+
+			print(f"Evicting {digest} from cache")
+			total -= entries.pop(digest)["size"]
+			if self.path_of(digest).exists():
+				os.remove(self.path_of(digest))
+
+		self.index["keys"] = {key: digest for key, digest in self.index["keys"].items() if digest in entries}
+
+	def stats(self) -> dict:
+		with self.lock:
+			stats = dict(self.index["stats"])
+			stats["entries"] = len(self.index["entries"])
+			stats["size"] = sum(entry["size"] for entry in self.index["entries"].values())
+			return stats
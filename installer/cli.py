@@ -0,0 +1,204 @@
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from http.client import HTTPException
+from pathlib import Path
+from urllib.error import URLError
+
+from installer.download import SEGMENTS
+from installer.engine import AccountError, InstallEngine, InstallError, lookup_username
+from installer.fleet import WORKERS, FleetInstall
+from installer.paths import default_folders
+from installer.releases import CHANNEL_INCLUDES, DEFAULT_CHANNEL
+from installer.versions import KEEP, VersionStore
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_NETWORK = 3
+EXIT_ACCOUNT = 4
+
+PASSWORD_ENV = "CRYSTAL_PASSWORD"
+
+
+class EventWriter:
+	"""
+	Writes one JSON object per line, so other programs can follow the install
+	"""
+
+	def __init__(self, file):
+		self.file = file
+
+	def write(self, event: str, **data):
+		data = {"event": event, "time": time.time(), **data}
+		self.file.write(json.dumps(data) + "\n")
+		self.file.flush()
+
+	def progress(self, text: str, value: int):
+		self.write("progress", text=text, value=value)
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+	parser = argparse.ArgumentParser(
+		prog="crystal-install",
+		description="Installs CrystalStudio without a UI. Progress is written to stdout as JSON lines, logs go to stderr."
+	)
+	parser.add_argument("--config", type=Path, help="JSON file with any of the options below, flags override it")
+	parser.add_argument("--save-folder", type=Path)
+	parser.add_argument("--projects-folder", type=Path)
+	parser.add_argument("--install-folder", type=Path, help="folder CrystalStudio is installed in, defaults to the current one")
+	parser.add_argument("--username")
+	parser.add_argument("--password", help=f"prefer setting {PASSWORD_ENV}, arguments are visible to other users")
+	account = parser.add_mutually_exclusive_group()
+	account.add_argument("--create-account", action="store_true", default=None)
+	account.add_argument("--login", dest="create_account", action="store_false")
+	parser.add_argument("--segments", type=int, help=f"parallel connections for the download (default {SEGMENTS})")
+	parser.add_argument(
+		"--no-stream-extract", dest="stream_extract", action="store_false", default=None,
+		help="never extract while downloading, by default only done when the release can't be downloaded in segments"
+	)
+	parser.add_argument("--channel", choices=list(CHANNEL_INCLUDES), help=f"release channel (default {DEFAULT_CHANNEL})")
+	parser.add_argument("--download-url", help="install this release archive instead of the newest one of the channel")
+	parser.add_argument("--sha256", help="SHA-256 the archive of --download-url must have, the install is aborted otherwise")
+	parser.add_argument("--keep-versions", type=int, help=f"installed versions kept for rollbacks (default {KEEP}), 0 installs in place")
+	parser.add_argument("--rollback", action="store_true", default=None, help="switch back to the previously installed version and exit")
+	parser.add_argument("--trace", type=Path, help="where to write the timing trace, defaults to the save folder")
+	parser.add_argument("--fleet", type=Path, help="JSON list of targets to install at once, see installer.fleet")
+	parser.add_argument("--fleet-workers", type=int, help=f"targets installed at the same time (default {WORKERS})")
+	args = parser.parse_args(argv)
+
+	if args.config is not None:
+		try:
+			with open(args.config, "r") as f:
+				config = json.load(f)
+		except (OSError, ValueError) as e:
+			parser.error(f"could not read config {args.config}: {e}")
+
+		for key, value in config.items():
+			key = key.replace("-", "_")
+			if not hasattr(args, key):
+				parser.error(f"unknown config option {key}")
+			if getattr(args, key) is None:
+				setattr(args, key, Path(value) if key.endswith("folder") else value)
+
+	args.password = args.password or os.getenv(PASSWORD_ENV)
+	if args.fleet is None and not args.rollback and (not args.username or not args.password):
+		parser.error(f"--username and --password (or {PASSWORD_ENV}) are required")
+
+	save_folder, projects_folder = default_folders()
+	args.save_folder = args.save_folder or save_folder
+	args.projects_folder = args.projects_folder or projects_folder
+	Path(args.save_folder).mkdir(parents=True, exist_ok=True)
+	Path(args.projects_folder).mkdir(parents=True, exist_ok=True)
+	args.create_account = bool(args.create_account)
+	args.segments = args.segments or SEGMENTS
+	args.stream_extract = args.stream_extract is not False
+	args.keep_versions = KEEP if args.keep_versions is None else args.keep_versions
+	args.channel = args.channel or DEFAULT_CHANNEL
+	args.rollback = bool(args.rollback)
+	args.fleet_workers = args.fleet_workers or WORKERS
+	return args
+
+
+def run_fleet(args: argparse.Namespace, events: EventWriter) -> int:
+	try:
+		with open(args.fleet, "r") as f:
+			targets = json.load(f)
+		fleet = FleetInstall(
+			targets,
+			workers=args.fleet_workers,
+			on_progress=lambda target, text, value: events.write("progress", target=target, text=text, value=value),
+			segments=args.segments,
+			stream_extract=args.stream_extract,
+			channel=args.channel,
+			download_url=args.download_url,
+			sha256=args.sha256,
+			keep_versions=args.keep_versions
+		)
+	except (OSError, ValueError) as e:
+		events.write("error", kind="usage", message=str(e))
+		return EXIT_USAGE
+
+	events.write("start", targets=len(targets))
+	try:
+		summary = fleet.run()
+	except (URLError, HTTPException, ConnectionError, TimeoutError) as e:
+		traceback.print_exc()
+		events.write("error", kind="network", message=str(e))
+		return EXIT_NETWORK
+	except Exception as e:
+		traceback.print_exc()
+		events.write("error", kind="install", message=str(e))
+		return EXIT_FAILED
+
+	events.write("summary", **summary)
+	return EXIT_OK if summary["failed"] == 0 else EXIT_FAILED
+
+
+def main(argv: list[str] | None = None) -> int:
+	# Everything printed (including pip) goes to stderr, stdout only carries the JSON events
+	events = EventWriter(os.fdopen(os.dup(sys.stdout.fileno()), "w"))
+	sys.stdout.flush()
+	os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+	try:
+		args = parse_args(sys.argv[1:] if argv is None else argv)
+	except SystemExit as e:
+		return EXIT_OK if e.code == 0 else EXIT_USAGE
+
+	if args.fleet is not None:
+		return run_fleet(args, events)
+
+	if args.rollback:
+		try:
+			version = VersionStore(args.install_folder or Path.cwd()).rollback()
+		except (OSError, ValueError) as e:
+			events.write("error", kind="install", message=str(e))
+			return EXIT_FAILED
+		events.write("done", version=version)
+		return EXIT_OK
+
+	events.write("start", save_folder=str(args.save_folder), projects_folder=str(args.projects_folder))
+	try:
+		username = args.username if args.create_account else lookup_username(args.username)
+		engine = InstallEngine(
+			args.create_account,
+			args.save_folder,
+			args.projects_folder,
+			username,
+			args.password,
+			segments=args.segments,
+			stream_extract=args.stream_extract,
+			install_folder=args.install_folder,
+			trace_path=args.trace,
+			channel=args.channel,
+			download_url=args.download_url,
+			sha256=args.sha256,
+			keep_versions=args.keep_versions,
+			on_progress=events.progress
+		)
+		engine.run()
+	except AccountError as e:
+		events.write("error", kind="account", message=str(e))
+		return EXIT_ACCOUNT
+	except InstallError as e:
+		events.write("error", kind="install", message=str(e))
+		return EXIT_FAILED
+	except (URLError, HTTPException, ConnectionError, TimeoutError) as e:
+		traceback.print_exc()
+		events.write("error", kind="network", message=str(e))
+		return EXIT_NETWORK
+	except Exception as e:
+		traceback.print_exc()
+		events.write("error", kind="install", message=str(e))
+		return EXIT_FAILED
+
+	events.write("done")
+	return EXIT_OK
+
+
+if __name__ == "__main__":
+	sys.exit(main())
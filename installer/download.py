@@ -0,0 +1,367 @@
+import http.client
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib import request
+from urllib.error import HTTPError, URLError
+
+from installer.integrity import StreamHash
+from installer.net import urlopen
+
+CHUNK_SIZE = 64 * 1024
+PROGRESS_INTERVAL = 0.1
+RETRIES = 3
+RETRY_DELAY = 1.0
+TIMEOUT = 30
+SEGMENTS = 4
+MIN_SEGMENT_SIZE = 1024 * 1024
+
+
+def format_bytes(amount: float) -> str:
+	for unit in ["B", "KB", "MB", "GB"]:
+		if amount < 1024 or unit == "GB":
+			return f"{amount:.1f} {unit}" if unit != "B" else f"{int(amount)} {unit}"
+		amount /= 1024
+
+
+def format_eta(seconds: float | None) -> str:
+	if seconds is None:
+		return "--:--"
+	seconds = int(seconds)
+	return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+class Progress:
+	"""
+	Keeps track of transferred bytes and throttles how often the progress callback gets called
+	"""
+
+	def __init__(self, total: int | None, callback=None, interval: float = PROGRESS_INTERVAL, initial: int = 0):
+		self.total = total
+		self.done = initial
+		self.initial = initial
+		self.callback = callback
+		self.interval = interval
+		self.started = time.monotonic()
+		self.last_report = 0.0
+
+	def speed(self) -> float:
+		elapsed = time.monotonic() - self.started
+		return (self.done - self.initial) / elapsed if elapsed > 0 else 0.0
+
+	def eta(self) -> float | None:
+		speed = self.speed()
+		if self.total is None or speed <= 0:
+			return None
+		return max(self.total - self.done, 0) / speed
+
+	def advance(self, amount: int, force: bool = False):
+		self.done += amount
+		now = time.monotonic()
+		if self.callback is None or (not force and now - self.last_report < self.interval):
+			return
+
+		self.last_report = now
+		self.callback(self.done, self.total, self.speed(), self.eta())
+
+
+class PartialFile:
+	"""
+	A partially downloaded file (<name>.part) and the metadata (<name>.part.json) needed to resume it later
+	"""
+
+	def __init__(self, destination: Path, url: str):
+		self.destination = Path(destination)
+		self.url = url
+		self.path = self.destination.with_name(self.destination.name + ".part")
+		self.meta_path = self.destination.with_name(self.destination.name + ".part.json")
+		self.meta = self.load_meta()
+
+	def load_meta(self) -> dict:
+		if not self.path.exists() or not self.meta_path.exists():
+			return {}
+
+		try:
+			with open(self.meta_path, "r") as f:
+				meta = json.load(f)
+		except (OSError, ValueError):
+			return {}
+
+		# A partial file of a different URL can never be resumed
+		return meta if meta.get("url") == self.url else {}
+
+	def dump_meta(self):
+		with open(self.meta_path, "w") as f:
+			json.dump(self.meta, f, indent=4)
+
+	@property
+	def validator(self) -> str | None:
+		# ETag is preferred, Last-Modified is only used if the server does not send one
+		return self.meta.get("etag") or self.meta.get("last_modified")
+
+	@property
+	def offset(self) -> int:
+		if not self.meta or self.validator is None:
+			return 0
+		return self.path.stat().st_size
+
+	def reset(self):
+		self.meta = {}
+		for path in [self.path, self.meta_path]:
+			if path.exists():
+				os.remove(path)
+
+	def remember(self, resp: http.client.HTTPResponse, total: int | None):
+		self.meta = {
+			"url": self.url,
+			"etag": resp.headers.get("ETag"),
+			"last_modified": resp.headers.get("Last-Modified"),
+			"length": total
+		}
+		self.dump_meta()
+
+	def finish(self):
+		os.replace(self.path, self.destination)
+		if self.meta_path.exists():
+			os.remove(self.meta_path)
+
+
+def content_range_total(header: str | None) -> int | None:
+	# Content-Range: bytes 100-999/1000
+	if header is None or "/" not in header:
+		return None
+	total = header.rsplit("/", 1)[1]
+	return int(total) if total.isdigit() else None
+
+
+def content_range_start(header: str | None) -> int | None:
+	if header is None or not header.startswith("bytes "):
+		return None
+	start = header[6:].split("-", 1)[0]
+	return int(start) if start.isdigit() else None
+
+
+def open_resumable(partial: PartialFile) -> tuple[http.client.HTTPResponse, int, int | None]:
+	"""
+	Opens the URL of partial, asking the server for the missing tail if there is a resumable partial file
+	:return: (response, offset the response starts at, total size)
+	"""
+	offset = partial.offset
+	req = request.Request(partial.url)
+	if offset > 0:
+		req.add_header("Range", f"bytes={offset}-")
+		# If-Range makes the server send the whole file instead of the range if it has changed since
+		req.add_header("If-Range", partial.validator)
+
+	try:
+		resp = urlopen(req, timeout=TIMEOUT)
+	except HTTPError as e:
+		if e.code != 416 or offset == 0:
+			raise
+		# Range not satisfiable, the partial file doesn't match the remote file anymore
+		print(f"Could not resume {partial.url}, restarting download")
+		partial.reset()
+		return open_resumable(partial)
+
+	if resp.status == 206:
+		if content_range_start(resp.headers.get("Content-Range")) == offset:
+			print(f"Resuming {partial.url} at {format_bytes(offset)}")
+			return resp, offset, content_range_total(resp.headers.get("Content-Range")) or partial.meta.get("length")
+
+		# Server sent a different range than asked for, start over with a plain request
+		resp.close()
+		partial.reset()
+		return open_resumable(partial)
+
+	if offset > 0:
+		print(f"Remote file changed, restarting download of {partial.url}")
+
+	length = resp.headers.get("Content-Length")
+	total = int(length) if length else None
+	partial.reset()
+	partial.remember(resp, total)
+	return resp, 0, total
+
+
+def download(url: str, destination: Path, on_progress=None, chunk_size: int = CHUNK_SIZE, retries: int = RETRIES,
+             stream_hash: StreamHash | None = None) -> int:
+	"""
+	Streams the file at url into destination in fixed-size chunks, so memory usage stays the same no matter how big the file is.
+	The download goes into <destination>.part first. If the connection drops it is resumed with a Range request, both within
+	this call (up to retries times) and across calls, as long as the server's ETag/Last-Modified didn't change.
+	:param url: URL to download
+	:param destination: file to write to, gets overwritten
+	:param on_progress: called with (done, total, bytes_per_second, eta_seconds). total and eta are None if the server does not send a Content-Length
+	:param chunk_size: amount of bytes read from the socket per write
+	:param retries: how often a dropped connection is resumed before giving up
+	:param stream_hash: fed with the whole file while it downloads
+	:return: size of the downloaded file
+	"""
+	partial = PartialFile(destination, url)
+	progress = None
+	attempt = 0
+
+	while True:
+		try:
+			resp, offset, total = open_resumable(partial)
+			with resp:
+				if progress is None:
+					progress = Progress(total, on_progress, initial=offset)
+				else:
+					progress.total = total
+					progress.done = offset
+					progress.initial = min(progress.initial, offset)
+
+				if stream_hash is not None:
+					# Only the part that was already downloaded before has to be read back
+					stream_hash.reset()
+					stream_hash.update_file(partial.path, offset)
+
+				with open(partial.path, "ab" if offset > 0 else "wb") as out_file:
+					while chunk := resp.read(chunk_size):
+						out_file.write(chunk)
+						progress.advance(len(chunk))
+						if stream_hash is not None:
+							stream_hash.update(chunk)
+
+			if total is not None and progress.done < total:
+				raise http.client.IncompleteRead(b"", total - progress.done)
+			break
+		except (URLError, OSError, http.client.HTTPException) as e:
+			if isinstance(e, HTTPError) or attempt >= retries:
+				raise
+
+			attempt += 1
+			print(f"Download of {url} interrupted ({e}), retrying ({attempt}/{retries})")
+			time.sleep(RETRY_DELAY * attempt)
+
+	partial.finish()
+	progress.advance(0, force=True)
+	return progress.done
+
+
+def probe(url: str) -> tuple[int | None, bool, str | None]:
+	"""
+	Asks the server about url without downloading it
+	:return: (size, whether the server accepts byte ranges, validator)
+	"""
+	with urlopen(request.Request(url, method="HEAD"), timeout=TIMEOUT) as resp:
+		length = resp.headers.get("Content-Length")
+		accepts_ranges = resp.headers.get("Accept-Ranges", "").lower() == "bytes"
+		validator = resp.headers.get("ETag") or resp.headers.get("Last-Modified")
+		return int(length) if length else None, accepts_ranges, validator
+
+
+def can_segment(probed: tuple[int | None, bool, str | None], segments: int = SEGMENTS) -> bool:
+	"""
+	:param probed: result of probe
+	:return: whether the file is big enough and served with byte ranges, so it can be downloaded in segments
+	"""
+	size, accepts_ranges, _ = probed
+	return segments > 1 and accepts_ranges and size is not None and size >= MIN_SEGMENT_SIZE * 2
+
+
+def download_segment(url: str, path: Path, start: int, end: int, validator: str | None, progress: Progress,
+                     lock: threading.Lock, chunk_size: int, retries: int, stream_hash: StreamHash | None = None):
+	"""
+	:param stream_hash: fed with the segment while it downloads, only for the first segment as the hash has to be fed
+		in order
+	"""
+	position = start
+	attempt = 0
+
+	while position <= end:
+		req = request.Request(url, headers={"Range": f"bytes={position}-{end}"})
+		if validator is not None:
+			req.add_header("If-Range", validator)
+
+		try:
+			with urlopen(req, timeout=TIMEOUT) as resp:
+				if resp.status != 206 or content_range_start(resp.headers.get("Content-Range")) != position:
+					raise ValueError(f"Server did not send range {position}-{end} of {url}, the file probably changed")
+
+				with open(path, "r+b") as out_file:
+					out_file.seek(position)
+					while position <= end and (chunk := resp.read(min(chunk_size, end - position + 1))):
+						out_file.write(chunk)
+						position += len(chunk)
+						if stream_hash is not None:
+							stream_hash.update(chunk)
+						with lock:
+							progress.advance(len(chunk))
+
+			if position <= end:
+				raise http.client.IncompleteRead(b"", end - position + 1)
+		except (URLError, OSError, http.client.HTTPException) as e:
+			if isinstance(e, HTTPError) or attempt >= retries:
+				raise
+
+			attempt += 1
+			print(f"Segment {start}-{end} of {url} interrupted ({e}), retrying ({attempt}/{retries})")
+			time.sleep(RETRY_DELAY * attempt)
+
+
+def download_segmented(url: str, destination: Path, on_progress=None, segments: int = SEGMENTS,
+                       chunk_size: int = CHUNK_SIZE, retries: int = RETRIES, probed: tuple | None = None,
+                       stream_hash: StreamHash | None = None) -> int:
+	"""
+	Downloads url over several connections at once, each fetching its own byte range into a preallocated file.
+	Falls back to a single resumable stream (see download) if the server doesn't support ranges or the file is small.
+	:param url: URL to download
+	:param destination: file to write to, gets overwritten
+	:param on_progress: called with (done, total, bytes_per_second, eta_seconds), aggregated over all segments
+	:param segments: amount of parallel connections
+	:param chunk_size: amount of bytes read from the socket per write
+	:param retries: how often a dropped segment is resumed before giving up
+	:param probed: result of probe(url) if the caller already has it
+	:param stream_hash: fed with the whole file. The first segment is hashed while it downloads. Segments arrive out of
+		order, so every later one is read back from the page cache as soon as it and all segments before it are done,
+		while the rest still download. Nothing is hashed in a separate pass after the download.
+	:return: size of the downloaded file
+	"""
+	try:
+		size, accepts_ranges, validator = probed or probe(url)
+	except (URLError, OSError, http.client.HTTPException) as e:
+		print(f"Could not probe {url} ({e}), using a single connection")
+		size, accepts_ranges, validator = None, False, None
+
+	partial = PartialFile(destination, url)
+	if not can_segment((size, accepts_ranges, validator), segments) or partial.offset > 0:
+		return download(url, destination, on_progress, chunk_size, retries, stream_hash)
+
+	segments = min(segments, size // MIN_SEGMENT_SIZE)
+	print(f"Downloading {url} in {segments} segments")
+
+	# The file is preallocated, so it can't be resumed as a single stream later
+	partial.reset()
+	with open(partial.path, "wb") as out_file:
+		out_file.truncate(size)
+
+	progress = Progress(size, on_progress)
+	lock = threading.Lock()
+	segment_size = size // segments
+	if stream_hash is not None:
+		stream_hash.reset()
+	with ThreadPoolExecutor(max_workers=segments) as pool:
+		futures = []
+		for i in range(segments):
+			start = i * segment_size
+			end = size - 1 if i == segments - 1 else start + segment_size - 1
+			futures.append((start, end, pool.submit(
+				download_segment, url, partial.path, start, end, validator, progress, lock, chunk_size, retries,
+				stream_hash if i == 0 else None
+			)))
+
+		# Waiting in order hashes every segment once the ones before it are done
+		for i, (start, end, future) in enumerate(futures):
+			future.result()
+			if stream_hash is not None and i > 0:
+				stream_hash.update_file(partial.path, end - start + 1, start)
+
+	partial.finish()
+	progress.advance(0, force=True)
+	print(f"Downloaded {format_bytes(size)} at {format_bytes(progress.speed())}/s")
+	return progress.done
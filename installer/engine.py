@@ -0,0 +1,435 @@
+import json
+import os
+import shutil
+import time
+import zipfile
+from http.client import HTTPException
+from pathlib import Path
+
+from installer.cache import ArtifactCache
+from installer.download import SEGMENTS, PartialFile, can_segment, download_segmented, format_bytes, format_eta, probe
+from installer.extract import download_and_extract, extract_selected
+from installer.fastcopy import check_space, copy_tree, move, preflight
+from installer.integrity import IntegrityError, StreamHash, check_digest, sha256_mapped
+from installer.libs import install_libs
+from installer.mirrors import MirrorProbes, MirrorStream, download_mirrored
+from installer.net import urlopen
+from installer.pipeline import Pipeline
+from installer.releases import DEFAULT_CHANNEL, INSTALLER_VERSION, NoRelease, Release, archive_folder, resolve_release
+from installer.trace import Tracer, dump_stage_times, load_stage_times
+from installer.update import STATE_NAME, apply_update
+from installer.urls import CHANNELS_URL, CHECK_URL, LOGIN_URL, REGISTER_URL, USER_URL
+from installer.versions import KEEP, VersionStore, supports_symlinks
+
+STAGES = ["account", "download", "extract", "libs", "content", "activate", "cleanup"]
+# Progress weights (roughly in seconds) until the durations of a real install have been measured
+DEFAULT_WEIGHTS = {"account": 1, "download": 4, "extract": 1, "libs": 2, "content": 1, "activate": 0.1, "cleanup": 1}
+MIN_WEIGHT = 0.05
+STAGE_TIMES_NAME = "stage_times.json"
+TRACE_NAME = "install_trace.json"
+MIRRORS_NAME = "mirrors.json"
+
+
+class InstallError(Exception):
+	"""
+	Raised when an install can't continue, the message is meant to be shown to the user
+	"""
+	pass
+
+
+class AccountError(InstallError):
+	pass
+
+
+def lookup_username(username: str, user_url: str = USER_URL) -> str:
+	"""
+	Asks the account server for the exact spelling of username
+	"""
+	with urlopen(user_url + username, decode=True) as resp:
+		return json.loads(resp.read().decode())["data"]["username"]
+
+
+class InstallEngine:
+	"""
+	Installs CrystalStudio without depending on any UI. Progress is reported through on_progress(text, value),
+	errors are raised as InstallError (or the network/OS error that caused them).
+	"""
+
+	def __init__(
+			self,
+			create_account: bool,
+			save_folder: Path,
+			projects_folder: Path,
+			username: str,
+			password: str,
+			check_url: str = CHECK_URL,
+			register_url: str = REGISTER_URL,
+			login_url: str = LOGIN_URL,
+			segments: int = SEGMENTS,
+			stream_extract: bool = True,
+			install_folder: Path | None = None,
+			staging: Path = Path("installation"),
+			source: Path | None = None,
+			trace_path: Path | None = None,
+			release: Release | None = None,
+			channel: str = DEFAULT_CHANNEL,
+			channels_url: str = CHANNELS_URL,
+			download_url: str | None = None,
+			sha256: str | None = None,
+			version: str | None = None,
+			keep_versions: int = KEEP,
+			installer_version: int = INSTALLER_VERSION,
+			on_progress=None
+	):
+		self.create_account = create_account
+		self.save_folder = save_folder
+		self.projects_folder = projects_folder
+		self.token = None
+		self.username = username
+		self.password = password
+		self.check_url = check_url
+		self.register_url = register_url
+		self.login_url = login_url
+		self.segments = segments
+		self.stream_extract = stream_extract
+		self.install_folder = Path(install_folder or os.getcwd())
+		self.staging = Path(staging)
+		# Already unpacked release to copy from instead of downloading one
+		self.source = Path(source) if source is not None else None
+		# Whether the download stage already unpacked the release
+		self.extracted = False
+		# Release to install, resolved from channel once the download starts. Giving a download_url (with an optional
+		# sha256 and version) installs that archive instead.
+		self.release = release
+		if self.release is None and download_url is not None:
+			self.release = Release(version or archive_folder(download_url), download_url, sha256=sha256)
+		self.channel = channel
+		self.channels_url = channels_url
+		# Releases that need a newer installer are skipped
+		self.installer_version = installer_version
+		# Installed versions kept for rollbacks, 0 installs in place without versions
+		self.keep_versions = keep_versions
+		self.versions = None
+		# Version folder installed by the content stage, activated once the libraries are installed
+		self.new_version = None
+		self.trace_path = Path(trace_path) if trace_path is not None else Path(save_folder) / TRACE_NAME
+		self.tracer = Tracer()
+		self.on_progress = on_progress
+
+	def run(self, stages: list[str] | None = None):
+		"""
+		:param stages: names of the stages to run, defaults to all of them. Dependencies on stages that aren't run are ignored.
+		"""
+		print("Fixing URLs")
+		# Update URLs to correct username and password
+		self.check_url = self.check_url.replace("%username%", self.username)
+		self.check_url = self.check_url.replace("%password%", self.password)
+
+		self.register_url = self.register_url.replace("%username%", self.username)
+		self.register_url = self.register_url.replace("%password%", self.password)
+
+		self.login_url = self.login_url.replace("%username%", self.username)
+		self.login_url = self.login_url.replace("%password%", self.password)
+
+		print("Install engine: run")
+		self.installation_location = self.staging / "download.zip"
+
+		if stages is None:
+			stages = STAGES if self.source is None else [stage for stage in STAGES if stage != "download"]
+		if "download" not in stages:
+			self.resolve()
+
+		# Weight the progress bar by how long every stage took during the last installs
+		stage_times_path = Path(self.save_folder) / STAGE_TIMES_NAME
+		weights = {**DEFAULT_WEIGHTS, **load_stage_times(stage_times_path)}
+
+		# Content replacing the install in place has to wait for the libraries, so a failed pip run doesn't leave
+		# CrystalStudio without them. A new version folder can be filled meanwhile, it is only activated after them.
+		self.versioned = False
+		if "content" in stages:
+			self.install_folder.mkdir(parents=True, exist_ok=True)
+			self.versioned = self.keep_versions > 0 and supports_symlinks(self.install_folder)
+
+		# Logging in and installing libraries don't depend on each other, content is only replaced once the account works
+		self.pipeline = Pipeline(self.emit_progress, tracer=self.tracer)
+
+		def add(name: str, func, after: list[str], text: str):
+			if name in stages:
+				after = [stage for stage in after if stage in stages]
+				self.pipeline.add(name, func, after, text, max(weights[name], MIN_WEIGHT))
+
+		add("account", self.stage_account, [], "Installing: Setting up CrystalStudio account")
+		add("download", self.stage_download, [], "Installing: Downloading latest release...")
+		add("extract", self.stage_extract, ["download"], "Installing: Unpacking latest release...")
+		add("libs", self.stage_libs, ["extract"], "Installing: Installing libraries...")
+		add("content", self.stage_content, ["account", "extract"] + ([] if self.versioned else ["libs"]),
+		    "Installing: Installing CrystalStudio...")
+		add("activate", self.stage_activate, ["content", "libs"], "Installing: Activating CrystalStudio...")
+		add("cleanup", self.stage_cleanup, ["libs", "content", "activate"], "Finishing...")
+		try:
+			self.pipeline.run()
+		except BaseException:
+			if self.new_version is not None and self.versions.current() != self.new_version:
+				# The previous version stays active, the new one would only be offered for rollbacks
+				self.versions.discard(self.new_version)
+			raise
+		finally:
+			self.tracer.dump(self.trace_path)
+
+		dump_stage_times(stage_times_path, self.tracer.durations())
+
+	def emit_progress(self, text: str, value: int):
+		if self.on_progress is not None:
+			self.on_progress(text, value)
+
+	def stage_account(self):
+		if self.create_account:
+			print("Registering pre-emit")
+			with urlopen(self.register_url, decode=True) as resp:
+				data = json.loads(resp.read().decode())
+				if data.get("state") != "success":
+					print(f"Failed register. {self.register_url=}, {self.login_url=}, {self.check_url=}, {data=}")
+					raise AccountError(f"Could not create account due to an error: {data.get('reason')}")
+		else:
+			print("Login pre-emit")
+			with urlopen(self.login_url, decode=True) as resp:
+				data = json.loads(resp.read().decode())
+				if data.get("state") != "success":
+					print(f"Failed login. {self.register_url=}, {self.login_url=}, {self.check_url=}, {data=}")
+					raise AccountError(f"Could not login due to an error: {data.get('reason')}")
+
+		self.token = data["token"]
+		secrets = {"username": self.username, "token": self.token}
+		self.dump_secrets(secrets)
+		print("Dumped secrets")
+		print(f"Created/logged into account {self.username}")
+
+	def resolve(self) -> Release:
+		if self.release is None:
+			try:
+				self.release = resolve_release(self.save_folder, self.channel, self.channels_url, self.installer_version)
+			except NoRelease as e:
+				raise InstallError(str(e)) from e
+		return self.release
+
+	def stage_download(self):
+		started = time.monotonic()
+		release = self.resolve()
+		download_url = release.url
+		failed_mirrors = []
+		installation_location = self.installation_location
+		installation_location.parent.mkdir(parents=True, exist_ok=True)
+		if release.size is not None:
+			check_space(installation_location.parent, release.size)
+
+		cache = ArtifactCache(Path(self.save_folder) / "cache")
+		self.archive = None
+		if release.sha256 is not None:
+			# Archives are cached by their SHA-256, so the release can be found even if it moved, without the network
+			self.archive = cache.lookup_digest(release.sha256.lower())
+			if self.archive is not None:
+				try:
+					check_digest(sha256_mapped(self.archive), release.sha256, "Cached release")
+				except IntegrityError as e:
+					print(f"{e}, downloading it again")
+					cache.discard(release.sha256.lower())
+					self.archive = None
+
+		probed = None
+		if self.archive is None:
+			try:
+				probed = probe(download_url)
+			except (OSError, HTTPException) as e:
+				print(f"Could not probe {download_url}: {e}")
+			if release.sha256 is None:
+				self.archive = cache.lookup(download_url, probed[2] if probed else None)
+
+		cached = self.archive is not None
+		mirrors = release.urls
+		probes = MirrorProbes(Path(self.save_folder) / "cache" / MIRRORS_NAME)
+		if self.archive is None and len(mirrors) > 1:
+			mirrors = probes.rank(mirrors, release.size or (probed[0] if probed else None))
+			download_url = mirrors[0]
+
+		self.extracted = False
+		stream_hash = StreamHash()
+		# Extracting while downloading needs the archive from its first byte, an interrupted download of an earlier
+		# install is rather resumed and extracted once it's complete
+		resumable = len(mirrors) == 1 and PartialFile(installation_location, download_url).offset > 0
+		if resumable:
+			print("Found an interrupted download, resuming it instead of extracting while downloading")
+		# Extracting while downloading reads the archive over a single connection. When the server serves ranges and
+		# the archive is big enough, several connections are faster and the archive is extracted afterwards.
+		segmented = len(mirrors) == 1 and probed is not None and can_segment(probed, self.segments)
+		if segmented and self.stream_extract and self.archive is None:
+			print(f"Downloading in up to {self.segments} segments instead of extracting while downloading")
+		if self.archive is None and self.stream_extract and not resumable and not segmented:
+			# Unpack while downloading, the archive is only kept for the cache
+			stream = MirrorStream(mirrors, release.size) if len(mirrors) > 1 else None
+			# Leftovers of an earlier attempt must not end up in the install
+			shutil.rmtree(installation_location.parent / release.folder, ignore_errors=True)
+			try:
+				download_and_extract(
+					download_url, installation_location, installation_location.parent, self.report_download, stream_hash,
+					stream
+				)
+				self.extracted = True
+			except (OSError, HTTPException, zipfile.BadZipFile) as e:
+				print(f"Could not extract while downloading ({e}), downloading first")
+			if stream is not None:
+				failed_mirrors += stream.failed
+
+		if self.archive is None:
+			if not self.extracted:
+				# Whatever the failed attempt to extract while downloading hashed is useless now
+				stream_hash = StreamHash()
+			if not self.extracted and len(mirrors) > 1:
+				failed_mirrors += download_mirrored(
+					mirrors, installation_location, self.report_download, stream_hash=stream_hash, total=release.size
+				)
+			elif not self.extracted:
+				download_segmented(
+					download_url, installation_location, self.report_download, self.segments, probed=probed,
+					stream_hash=stream_hash
+				)
+			for url in set(failed_mirrors):
+				probes.record_failure(url)
+
+			# Checked before the archive is cached or anything is installed from it
+			try:
+				check_digest(stream_hash.hexdigest(), release.sha256, "Downloaded release")
+			except IntegrityError as e:
+				os.remove(installation_location)
+				shutil.rmtree(installation_location.parent / release.folder, ignore_errors=True)
+				raise InstallError(f"The downloaded release is damaged, please try again. ({e})") from e
+			self.archive = cache.store(
+				installation_location, release.url, probed[2] if probed else None, stream_hash.hexdigest()
+			)
+		print(f"Archive cache: {cache.stats()}")
+
+		downloaded = 0 if cached else self.archive.stat().st_size
+		elapsed = time.monotonic() - started
+		self.tracer.annotate(
+			"download",
+			bytes=downloaded,
+			bytes_per_second=downloaded / elapsed if elapsed > 0 else 0,
+			cache_hit=cached,
+			mirror=download_url,
+			failed_mirrors=failed_mirrors,
+			segmented=segmented and not cached,
+			streamed_extract=self.extracted,
+			version=release.version,
+			verified=release.sha256 is not None
+		)
+
+	def stage_extract(self):
+		self.unpacked_installation = self.installation_location.parent / Path(self.release.folder)
+		if not self.extracted:
+			# Staging is kept after failed installs (for resuming the download), files of an earlier attempt must not
+			# end up in the install
+			shutil.rmtree(self.unpacked_installation, ignore_errors=True)
+
+		if self.source is not None:
+			# Every install gets its own copy, content is moved out of it
+			copy_tree(self.source, self.staging / self.release.folder)
+		elif not self.extracted:
+			extract_selected(
+				self.archive, self.installation_location.parent, self.release.folder + "/",
+				cancelled=self.pipeline.cancelled
+			)
+
+		with open(self.unpacked_installation / "installation.json", "r") as f:
+			self.installation_json = json.load(f)
+
+		files = 0
+		size = 0
+		for root, _, names in os.walk(self.unpacked_installation):
+			files += len(names)
+			size += sum(os.path.getsize(os.path.join(root, name)) for name in names)
+		self.tracer.annotate("extract", files=files, bytes=size)
+
+	def stage_libs(self):
+		libs: list[str] = self.installation_json["libs"]
+		self.tracer.annotate("libs", libs=len(libs))
+		if install_libs(libs, wheelhouse=Path(self.save_folder) / "wheelhouse") != 0:
+			raise InstallError("Could not install the libraries CrystalStudio needs")
+
+	def stage_content(self):
+		if self.versioned:
+			self.install_version()
+		else:
+			self.install_in_place()
+
+	def install_version(self):
+		"""
+		Installs the release next to the previous ones without activating it, see stage_activate
+		"""
+		content: list[str] = self.installation_json["content"]
+		# With a hash for every file, only what changed is moved and everything else is linked from the active version
+		files: dict[str, str] | None = self.installation_json.get("files")
+		self.versions = VersionStore(self.install_folder, self.keep_versions)
+		self.new_version = self.versions.install(
+			self.release.version, self.unpacked_installation, content, files, Path(self.save_folder) / STATE_NAME
+		)
+		self.tracer.annotate("content", versioned=True, version=self.new_version, incremental=files is not None)
+
+	def stage_activate(self):
+		"""
+		Switches to the new version with one symlink swap once its libraries are installed, so a failed or interrupted
+		install always leaves the previous version working
+		"""
+		if self.new_version is None:
+			return
+
+		started = time.monotonic()
+		# Content installed in place before versioned installs only moves once nothing can fail anymore
+		self.versions.adopt(self.installation_json["content"])
+		self.versions.activate(self.new_version)
+		self.tracer.annotate("activate", version=self.new_version, seconds=time.monotonic() - started)
+
+	def install_in_place(self):
+		unpacked_installation = self.unpacked_installation
+		content: list[str] = self.installation_json["content"]
+		files: dict[str, str] | None = self.installation_json.get("files")
+		if files is not None:
+			# The release ships a hash for every file, so only what changed has to be replaced
+			touched = apply_update(unpacked_installation, self.install_folder, files, Path(self.save_folder) / STATE_NAME)
+			print(f"Incremental update touched {format_bytes(touched)}")
+			self.tracer.annotate("content", incremental=True, bytes=touched)
+			content = []
+		else:
+			self.tracer.annotate("content", incremental=False, items=len(content))
+
+		# Nothing is removed before it's certain the new content fits
+		preflight([(unpacked_installation / cnt.rstrip("/"), self.install_folder / cnt.rstrip("/")) for cnt in content])
+		for cnt in content:
+			print(f"Installing content '{cnt}'")
+			target = self.install_folder / cnt
+			if cnt.endswith("/"):
+				if os.path.exists(target):
+					print("Removing original...")
+					shutil.rmtree(target)
+			else:
+				if os.path.exists(target):
+					print("Removing original...")
+					os.remove(target)
+
+			move(unpacked_installation / cnt.rstrip("/"), self.install_folder / cnt.rstrip("/"))
+			print(f"Finished installing content '{cnt}'")
+
+	def stage_cleanup(self):
+		shutil.rmtree(self.staging)
+		if self.versions is not None:
+			self.versions.prune()
+
+	def report_download(self, done: int, total: int | None, speed: float, eta: float | None):
+		size = f"{format_bytes(done)} / {format_bytes(total)}" if total else format_bytes(done)
+		self.pipeline.report(
+			"download",
+			done / total if total else 0.0,
+			f"Installing: Downloading latest release... {size} ({format_bytes(speed)}/s, ETA {format_eta(eta)})"
+		)
+
+	def dump_secrets(self, secrets: dict):
+		with open(Path(self.save_folder) / "secrets.json", "w") as f:
+			json.dump(secrets, f, indent=4)
@@ -0,0 +1,301 @@
+import http.client
+import json
+import os
+import shutil
+import struct
+import threading
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from installer.download import CHUNK_SIZE, PartialFile, Progress, open_resumable
+from installer.integrity import StreamHash
+from installer.pipeline import Cancelled
+
+LOCAL_SIGNATURE = b"PK\x03\x04"
+DESCRIPTOR_SIGNATURE = b"PK\x07\x08"
+# signature, version, flags, method, time, date, crc, compressed size, size, name length, extra length
+LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+DESCRIPTOR = struct.Struct("<III")
+
+FLAG_ENCRYPTED = 0x1
+FLAG_DESCRIPTOR = 0x8
+FLAG_UTF8 = 0x800
+
+EXTRACT_WORKERS = min(8, (os.cpu_count() or 1) + 2)
+MANIFEST_NAME = "installation.json"
+
+
+class UnsupportedArchive(Exception):
+	"""
+	Raised when an archive can't be extracted from a stream and has to be extracted from the finished file instead
+	"""
+	pass
+
+
+class StreamReader:
+	"""
+	Reads from a stream that can only be read forwards, with support for pushing back bytes that were read too far
+	"""
+
+	def __init__(self, stream):
+		self.stream = stream
+		self.buffer = b""
+
+	def read(self, size: int = CHUNK_SIZE) -> bytes:
+		if self.buffer:
+			data, self.buffer = self.buffer[:size], self.buffer[size:]
+			return data
+		return self.stream.read(size)
+
+	def read_exact(self, size: int) -> bytes:
+		data = b""
+		while len(data) < size:
+			chunk = self.read(size - len(data))
+			if not chunk:
+				raise zipfile.BadZipFile("Archive ended unexpectedly")
+			data += chunk
+		return data
+
+	def unread(self, data: bytes):
+		self.buffer = data + self.buffer
+
+
+class TeeStream:
+	"""
+	Stream that writes everything read from it into a file (and optionally a hash) as well
+	"""
+
+	def __init__(self, stream, file, progress: Progress | None = None, stream_hash: StreamHash | None = None):
+		self.stream = stream
+		self.file = file
+		self.progress = progress
+		self.stream_hash = stream_hash
+
+	def read(self, size: int = CHUNK_SIZE) -> bytes:
+		data = self.stream.read(size)
+		self.file.write(data)
+		if self.progress is not None:
+			self.progress.advance(len(data))
+		if self.stream_hash is not None:
+			self.stream_hash.update(data)
+		return data
+
+
+def safe_target(destination: Path, name: str) -> Path:
+	target = (destination / name).resolve()
+	if not target.is_relative_to(destination.resolve()):
+		raise zipfile.BadZipFile(f"Archive member {name} points outside of the destination")
+	return target
+
+
+def extract_member(reader: StreamReader, out_file, method: int, flags: int, compressed_size: int) -> tuple[int, int]:
+	"""
+	Copies the data of one archive member into out_file
+	:return: (crc, size) of the written data
+	"""
+	crc = 0
+	size = 0
+
+	if method == zipfile.ZIP_STORED:
+		if flags & FLAG_DESCRIPTOR:
+			# The end of a stored member is only known from the central directory
+			raise UnsupportedArchive("Stored member with data descriptor")
+
+		remaining = compressed_size
+		while remaining > 0:
+			chunk = reader.read(min(CHUNK_SIZE, remaining))
+			if not chunk:
+				raise zipfile.BadZipFile("Archive ended unexpectedly")
+			remaining -= len(chunk)
+			crc = zlib.crc32(chunk, crc)
+			size += len(chunk)
+			out_file.write(chunk)
+		return crc, size
+
+	if method != zipfile.ZIP_DEFLATED:
+		raise UnsupportedArchive(f"Compression method {method}")
+
+	decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+	remaining = None if flags & FLAG_DESCRIPTOR else compressed_size
+	while not decompressor.eof:
+		chunk = reader.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+		if not chunk:
+			raise zipfile.BadZipFile("Archive ended unexpectedly")
+		if remaining is not None:
+			remaining -= len(chunk)
+
+		data = decompressor.decompress(chunk)
+		crc = zlib.crc32(data, crc)
+		size += len(data)
+		out_file.write(data)
+
+	# Deflate knows where it ends, anything read past that belongs to the next header
+	reader.unread(decompressor.unused_data)
+	return crc, size
+
+
+def extract_stream(stream, destination: Path) -> list[str]:
+	"""
+	Extracts a zip archive while it is being read, using the local file headers instead of the central directory
+	at the end of the archive. Raises UnsupportedArchive for archives that need the central directory (ZIP64,
+	encryption, stored members with data descriptors), the caller should extract from the finished file then.
+	:param stream: readable binary stream of the archive
+	:param destination: folder to extract to
+	:return: names of all extracted members
+	"""
+	reader = StreamReader(stream)
+	names = []
+
+	while True:
+		signature = reader.read_exact(4)
+		if signature != LOCAL_SIGNATURE:
+			# Reached the central directory, every member has been extracted
+			break
+
+		header = LOCAL_HEADER.unpack(signature + reader.read_exact(LOCAL_HEADER.size - 4))
+		_, _, flags, method, _, _, crc, compressed_size, size, name_length, extra_length = header
+		raw_name = reader.read_exact(name_length)
+		reader.read_exact(extra_length)
+		name = raw_name.decode("utf-8" if flags & FLAG_UTF8 else "cp437")
+
+		if flags & FLAG_ENCRYPTED:
+			raise UnsupportedArchive(f"{name} is encrypted")
+		if 0xFFFFFFFF in (compressed_size, size):
+			raise UnsupportedArchive(f"{name} is a ZIP64 member")
+
+		target = safe_target(destination, name)
+		if name.endswith("/"):
+			target.mkdir(parents=True, exist_ok=True)
+			with open(os.devnull, "wb") as out_file:
+				written_crc, written_size = extract_member(reader, out_file, method, flags, compressed_size)
+		else:
+			target.parent.mkdir(parents=True, exist_ok=True)
+			with open(target, "wb") as out_file:
+				written_crc, written_size = extract_member(reader, out_file, method, flags, compressed_size)
+
+		if flags & FLAG_DESCRIPTOR:
+			descriptor = reader.read_exact(4)
+			if descriptor == DESCRIPTOR_SIGNATURE:
+				descriptor = reader.read_exact(DESCRIPTOR.size)
+			else:
+				descriptor += reader.read_exact(DESCRIPTOR.size - 4)
+			crc, compressed_size, size = DESCRIPTOR.unpack(descriptor)
+
+		if written_crc != crc or written_size != size:
+			raise zipfile.BadZipFile(f"Bad CRC or size for {name}")
+
+		names.append(name)
+
+	return names
+
+
+def download_and_extract(url: str, archive: Path, destination: Path, on_progress=None,
+                         stream_hash: StreamHash | None = None, stream=None) -> list[str]:
+	"""
+	Extracts the archive at url into destination while it downloads, so unpacking overlaps the transfer.
+	The raw archive is still written to archive (through a resumable .part file) so it can be cached or resumed.
+	:param url: URL of the zip archive
+	:param archive: where to keep the downloaded archive. A partial download of it is started over, as extracting needs
+		the archive from the start, so check PartialFile.offset and resume with download() instead if there is one.
+	:param destination: folder to extract to
+	:param on_progress: called with (done, total, bytes_per_second, eta_seconds)
+	:param stream_hash: fed with the whole archive while it downloads
+	:param stream: read the archive from this instead of opening url, e.g. a MirrorStream
+	:return: names of all extracted members
+	"""
+	partial = PartialFile(archive, url)
+	partial.reset()
+	if stream is not None:
+		resp = stream
+		total = stream.start()
+	else:
+		resp, _, total = open_resumable(partial)
+	progress = Progress(total, on_progress)
+
+	with resp, open(partial.path, "wb") as out_file:
+		tee = TeeStream(resp, out_file, progress, stream_hash)
+		try:
+			names = extract_stream(tee, destination)
+		except UnsupportedArchive as e:
+			print(f"Can't extract while downloading ({e}), extracting after download instead")
+			names = None
+
+		# Read the rest (central directory) so the archive on disk is complete
+		with open(os.devnull, "wb") as null:
+			shutil.copyfileobj(tee, null, CHUNK_SIZE)
+
+	if total is not None and progress.done < total:
+		raise http.client.IncompleteRead(b"", total - progress.done)
+
+	partial.finish()
+	progress.advance(0, force=True)
+	if names is None:
+		with zipfile.ZipFile(archive, "r") as zip_ref:
+			names = zip_ref.namelist()
+			zip_ref.extractall(destination)
+	return names
+
+
+def is_wanted(name: str, content: list[str]) -> bool:
+	# Folders in content end with a slash and include everything inside of them
+	for cnt in content:
+		if name == cnt or (cnt.endswith("/") and name.startswith(cnt)):
+			return True
+	return False
+
+
+def extract_selected(archive: Path, destination: Path, prefix: str = "", workers: int = EXTRACT_WORKERS,
+                     cancelled: threading.Event | None = None) -> dict:
+	"""
+	Extracts only the members of archive that are listed in the content of its installation.json (and the manifest itself),
+	spread over a thread pool. Every member is CRC checked while it is read.
+	:param archive: zip archive of a release
+	:param destination: folder to extract to
+	:param prefix: folder inside the archive that contains installation.json, with a trailing slash
+	:param workers: amount of threads decompressing at the same time
+	:param cancelled: stops extracting with Cancelled once it is set, see Pipeline.cancelled
+	:return: the parsed installation.json
+	"""
+	with zipfile.ZipFile(archive, "r") as zip_ref:
+		manifest = json.loads(zip_ref.read(prefix + MANIFEST_NAME).decode())
+		content = manifest["content"]
+		members = [
+			info for info in zip_ref.infolist()
+			if info.filename == prefix + MANIFEST_NAME or is_wanted(info.filename[len(prefix):], content)
+		]
+		total = len(zip_ref.infolist())
+
+	print(f"Extracting {len(members)} of {total} archive members")
+	local = threading.local()
+	zip_refs = []
+
+	def extract(info: zipfile.ZipInfo):
+		if cancelled is not None and cancelled.is_set():
+			raise Cancelled("Extracting was cancelled")
+
+		# ZipFile objects share one file position, so every thread gets its own
+		if not hasattr(local, "zip_ref"):
+			local.zip_ref = zipfile.ZipFile(archive, "r")
+			zip_refs.append(local.zip_ref)
+
+		target = safe_target(destination, info.filename)
+		if info.is_dir():
+			target.mkdir(parents=True, exist_ok=True)
+			return
+
+		target.parent.mkdir(parents=True, exist_ok=True)
+		# Reading the member to the end raises BadZipFile if the CRC doesn't match
+		with local.zip_ref.open(info) as src, open(target, "wb") as dst:
+			shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+	try:
+		with ThreadPoolExecutor(max_workers=workers) as pool:
+			for _ in pool.map(extract, members):
+				pass
+	finally:
+		for zip_ref in zip_refs:
+			zip_ref.close()
+
+	return manifest
@@ -0,0 +1,298 @@
+import ctypes
+import errno
+import os
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Copying many small files is mostly waiting for the filesystem, but a single core only loses time switching threads
+COPY_WORKERS = 1 if (os.cpu_count() or 1) == 1 else min(16, os.cpu_count() * 2)
+# Free space that is left over after copying, so the disk isn't filled up to the last byte
+SPACE_MARGIN = 64 * 1024 * 1024
+# Linux ioctl that shares the blocks of one file with another (btrfs, XFS, ...)
+FICLONE = 0x40049409
+# Flag of clonefile(2) on macOS, doesn't follow a symlink at the source
+CLONE_NOFOLLOW = 0x0001
+CHUNK_SIZE = 8 * 1024 * 1024
+
+
+class NotEnoughSpace(Exception):
+	"""
+	Raised before anything is copied if the destination doesn't have enough free space
+	"""
+	pass
+
+
+def device_of(path: Path) -> int:
+	"""
+	:return: device of path, or of the closest folder above it that exists
+	"""
+	path = Path(path).absolute()
+	while not path.exists() and path.parent != path:
+		path = path.parent
+	return path.stat().st_dev
+
+
+def same_device(source: Path, destination: Path) -> bool:
+	return device_of(source) == device_of(destination)
+
+
+def tree_size(path: Path) -> int:
+	path = Path(path)
+	if path.is_symlink() or path.is_file():
+		return path.lstat().st_size
+
+	size = 0
+	for root, _, names in os.walk(path):
+		size += sum(os.lstat(os.path.join(root, name)).st_size for name in names)
+	return size
+
+
+def check_space(destination: Path, needed: int, margin: int = SPACE_MARGIN):
+	"""
+	Raises NotEnoughSpace if the filesystem of destination can't take needed more bytes
+	"""
+	folder = Path(destination).absolute()
+	while not folder.exists() and folder.parent != folder:
+		folder = folder.parent
+
+	free = shutil.disk_usage(folder).free
+	if needed + margin > free:
+		raise NotEnoughSpace(f"{needed // 2 ** 20} MB are needed in {folder}, but only {free // 2 ** 20} MB are free")
+
+
+def clone_file(source_fd: int, destination_fd: int, size: int) -> bool:
+	"""
+	Makes destination share the blocks of source instead of copying them, where the filesystem supports it
+	"""
+	if not sys.platform.startswith("linux"):
+		return False
+
+	import fcntl
+
+	try:
+		fcntl.ioctl(destination_fd, FICLONE, source_fd)
+		return True
+	except OSError:
+		return False
+
+
+clonefile = None
+
+
+def clone_path(source: Path, destination: Path) -> bool:
+	"""
+	Makes destination a clone of source with clonefile(2) on macOS, which shares the blocks on APFS. Unlike FICLONE it
+	works on paths and creates destination itself, so it is tried before destination is opened.
+	"""
+	global clonefile
+	if sys.platform != "darwin":
+		return False
+
+	if clonefile is None:
+		clonefile = getattr(ctypes.CDLL(None, use_errno=True), "clonefile", False)
+		if clonefile:
+			clonefile.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_uint32]
+			clonefile.restype = ctypes.c_int
+	if not clonefile:
+		return False
+
+	if os.path.lexists(destination):
+		os.remove(destination)
+	return clonefile(os.fsencode(source), os.fsencode(destination), CLONE_NOFOLLOW) == 0
+
+
+def kernel_copy(copy, source_fd: int, destination_fd: int, size: int) -> bool:
+	"""
+	Calls copy(source_fd, destination_fd, offset, count) until size bytes are copied
+	:return: False if copy isn't supported for these files
+	"""
+	copied = 0
+	try:
+		while copied < size:
+			amount = copy(source_fd, destination_fd, copied, min(CHUNK_SIZE, size - copied))
+			if amount == 0:
+				break
+			copied += amount
+	except OSError as e:
+		# Only fall back if nothing was copied yet, everything else is a real error
+		if copied == 0 and e.errno in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF,
+		                               errno.ENOTSOCK):
+			return False
+		raise
+	return copied == size
+
+
+def copy_range(source_fd: int, destination_fd: int, size: int) -> bool:
+	"""
+	Copies inside the kernel with copy_file_range, which can also use server-side copies and reflinks
+	"""
+	if not hasattr(os, "copy_file_range"):
+		return False
+	return kernel_copy(
+		lambda source, destination, offset, count: os.copy_file_range(source, destination, count, offset, offset),
+		source_fd, destination_fd, size
+	)
+
+
+def send_file(source_fd: int, destination_fd: int, size: int) -> bool:
+	"""
+	Copies inside the kernel with sendfile, which works between any filesystems on Linux
+	"""
+	if not sys.platform.startswith("linux"):
+		return False
+	return kernel_copy(
+		lambda source, destination, offset, count: os.sendfile(destination, source, offset, count),
+		source_fd, destination_fd, size
+	)
+
+
+def reflink(source: Path, destination: Path) -> bool:
+	"""
+	Makes destination a copy-on-write clone of source (clonefile on macOS, FICLONE on Linux), without falling back to
+	copying the bytes
+	:return: False if the filesystem can't share blocks, destination doesn't exist then
+	"""
+	if sys.platform == "darwin":
+		return clone_path(source, destination)
+
+	with open(source, "rb") as source_file, open(destination, "wb") as destination_file:
+		cloned = clone_file(source_file.fileno(), destination_file.fileno(), os.fstat(source_file.fileno()).st_size)
+	if not cloned:
+		os.remove(destination)
+		return False
+	shutil.copystat(source, destination)
+	return True
+
+
+COPY_METHODS = [clone_file, copy_range, send_file]
+# (source device, destination device) -> index of the first method in COPY_METHODS that worked between them,
+# so methods that can't work aren't tried again for every file
+working_methods: dict[tuple[int, int], int] = {}
+# (source device, destination device) -> whether clone_path worked between them
+working_clones: dict[tuple[int, int], bool] = {}
+
+
+def copy_file(source: Path, destination: Path):
+	"""
+	Copies a file with the cheapest method available: a reflink (clonefile on macOS, FICLONE on Linux),
+	copy_file_range, sendfile or shutil.copyfile (which uses fcopyfile on macOS). Permissions and times are copied as well.
+	"""
+	if sys.platform == "darwin":
+		devices = (os.stat(source).st_dev, device_of(Path(destination).parent))
+		if working_clones.get(devices, True):
+			working_clones[devices] = clone_path(source, destination)
+			if working_clones[devices]:
+				shutil.copystat(source, destination)
+				return
+
+	with open(source, "rb") as source_file, open(destination, "wb") as destination_file:
+		source_fd = source_file.fileno()
+		destination_fd = destination_file.fileno()
+		size = os.fstat(source_fd).st_size
+		devices = (os.fstat(source_fd).st_dev, os.fstat(destination_fd).st_dev)
+
+		copied = False
+		for i in range(working_methods.get(devices, 0), len(COPY_METHODS)):
+			if COPY_METHODS[i](source_fd, destination_fd, size):
+				working_methods[devices] = i
+				copied = True
+				break
+
+	if not copied:
+		working_methods[devices] = len(COPY_METHODS)
+		shutil.copyfile(source, destination)
+	shutil.copystat(source, destination)
+
+
+def copy_tree(source: Path, destination: Path, workers: int = COPY_WORKERS) -> int:
+	"""
+	Copies the folder source to destination. Folders are created first, then files are copied by several workers,
+	which pays off for trees with many small files.
+	:return: amount of bytes copied
+	"""
+	files = []
+	folders = []
+	size = 0
+	pending = [(str(source), str(destination))]
+	while pending:
+		folder, target_folder = pending.pop()
+		os.makedirs(target_folder, exist_ok=True)
+		folders.append((folder, target_folder))
+		with os.scandir(folder) as entries:
+			for entry in entries:
+				target = os.path.join(target_folder, entry.name)
+				if entry.is_symlink():
+					if os.path.lexists(target):
+						os.remove(target)
+					os.symlink(os.readlink(entry.path), target)
+				elif entry.is_dir():
+					pending.append((entry.path, target))
+				else:
+					files.append((entry.path, target))
+					size += entry.stat().st_size
+
+	if workers <= 1:
+		for path, target in files:
+			copy_file(path, target)
+	else:
+		with ThreadPoolExecutor(max_workers=workers) as pool:
+			list(pool.map(lambda pair: copy_file(*pair), files))
+
+	# Folder times change while files are copied into them
+	for folder, target_folder in folders:
+		shutil.copystat(folder, target_folder)
+	return size
+
+
+def move(source: Path, destination: Path, workers: int = COPY_WORKERS) -> bool:
+	"""
+	Moves a file or folder. On the same filesystem this is a rename, otherwise it is copied (see copy_tree) and
+	the source removed afterwards.
+	:param destination: new path of source, not the folder to move it into
+	:return: whether it had to be copied
+	"""
+	source = Path(source)
+	destination = Path(destination)
+	if same_device(source, destination.parent):
+		os.replace(source, destination)
+		return False
+
+	if source.is_dir() and not source.is_symlink():
+		copy_tree(source, destination, workers)
+		shutil.rmtree(source)
+	else:
+		copy_file(source, destination)
+		os.remove(source)
+	return True
+
+
+def preflight(moves: list[tuple[Path, Path]]) -> int:
+	"""
+	Checks the free space of every filesystem that (source, destination) pairs have to be copied to against what will
+	be copied there, raising NotEnoughSpace before anything is written
+	:return: amount of bytes that will have to be copied
+	"""
+	needed: dict[int, tuple[Path, int]] = {}
+	for source, destination in moves:
+		if not same_device(source, Path(destination).parent):
+			device = device_of(Path(destination).parent)
+			folder, size = needed.get(device, (Path(destination).parent, 0))
+			needed[device] = (folder, size + tree_size(source))
+
+	for folder, size in needed.values():
+		check_space(folder, size)
+	return sum(size for _, size in needed.values())
+
+
+def move_many(moves: list[tuple[Path, Path]], workers: int = COPY_WORKERS) -> int:
+	"""
+	Moves every (source, destination) pair (see move) after checking there is enough space for them
+	:return: amount of bytes that had to be copied
+	"""
+	copied = preflight(moves)
+	for source, destination in moves:
+		Path(destination).parent.mkdir(parents=True, exist_ok=True)
+		move(source, destination, workers)
+	return copied
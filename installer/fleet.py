@@ -0,0 +1,135 @@
+import shutil
+import tempfile
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from installer.engine import InstallEngine
+
+WORKERS = 4
+TARGET_KEYS = ["save_folder", "projects_folder", "install_folder", "username", "password", "create_account"]
+
+
+def check_targets(targets: list[dict]):
+	"""
+	Raises ValueError if a target is incomplete or two targets would share an install or save folder
+	"""
+	install_folders = set()
+	save_folders = set()
+	for i, target in enumerate(targets):
+		for key in TARGET_KEYS:
+			if target.get(key) is None:
+				raise ValueError(f"Target {i} is missing {key}")
+
+		install_folder = Path(target["install_folder"]).resolve()
+		if install_folder in install_folders:
+			raise ValueError(f"Target {i} installs into {install_folder}, which is already used by another target")
+		install_folders.add(install_folder)
+
+		# Account secrets, install state and traces live in the save folder
+		save_folder = Path(target["save_folder"]).resolve()
+		if save_folder in save_folders:
+			raise ValueError(f"Target {i} saves into {save_folder}, which is already used by another target")
+		save_folders.add(save_folder)
+
+
+class FleetInstall:
+	"""
+	Installs the same release for many targets (save/projects/install folder and account) at once. The release is
+	downloaded, unpacked and its libraries installed only once, then every target gets its own staging copy and is
+	installed in parallel.
+	"""
+
+	def __init__(self, targets: list[dict], work_folder: Path | None = None, workers: int = WORKERS, on_progress=None,
+	             **engine_options):
+		"""
+		:param targets: dicts with save_folder, projects_folder, install_folder, username, password and create_account
+		:param work_folder: where the staging folders are created, defaults to a temporary folder
+		:param workers: amount of targets installed at the same time
+		:param on_progress: called with (target index or None for the shared preparation, text, value)
+		:param engine_options: passed to every InstallEngine, e.g. segments
+		"""
+		check_targets(targets)
+		self.targets = targets
+		self.work_folder = Path(work_folder or tempfile.mkdtemp(prefix="crystal-fleet-"))
+		self.workers = workers
+		self.on_progress = on_progress
+		self.engine_options = engine_options
+		self.release = None
+
+	def progress(self, target: int | None):
+		if self.on_progress is None:
+			return None
+		return lambda text, value: self.on_progress(target, text, value)
+
+	def prepare(self) -> Path:
+		"""
+		Downloads and unpacks the release and installs its libraries, using the first target's save folder for caches
+		:return: the unpacked release
+		"""
+		first = self.targets[0]
+		engine = InstallEngine(
+			False,
+			first["save_folder"],
+			first["projects_folder"],
+			"",
+			"",
+			staging=self.work_folder / "shared",
+			on_progress=self.progress(None),
+			**self.engine_options
+		)
+		engine.run(["download", "extract", "libs"])
+		self.release = engine.release
+		return engine.unpacked_installation
+
+	def install_target(self, index: int, source: Path) -> dict:
+		target = self.targets[index]
+		started = time.monotonic()
+		result = {"target": index, "install_folder": str(target["install_folder"]), "ok": True, "error": None}
+		try:
+			Path(target["save_folder"]).mkdir(parents=True, exist_ok=True)
+			engine = InstallEngine(
+				target["create_account"],
+				target["save_folder"],
+				target["projects_folder"],
+				target["username"],
+				target["password"],
+				install_folder=target["install_folder"],
+				staging=self.work_folder / f"target-{index}",
+				source=source,
+				release=self.release,
+				on_progress=self.progress(index),
+				**self.engine_options
+			)
+			engine.run(["account", "extract", "content", "activate", "cleanup"])
+		except Exception as e:
+			traceback.print_exc()
+			result["ok"] = False
+			result["error"] = str(e)
+
+		result["seconds"] = time.monotonic() - started
+		print(f"Target {index}: {'installed' if result['ok'] else 'failed'} in {result['seconds']:.1f} s")
+		return result
+
+	def run(self) -> dict:
+		"""
+		:return: summary with the time of the shared preparation and a result per target
+		"""
+		started = time.monotonic()
+		try:
+			source = self.prepare()
+			prepared = time.monotonic()
+
+			with ThreadPoolExecutor(max_workers=self.workers) as pool:
+				results = list(pool.map(lambda index: self.install_target(index, source), range(len(self.targets))))
+		finally:
+			shutil.rmtree(self.work_folder, ignore_errors=True)
+
+		return {
+			"prepare_seconds": prepared - started,
+			"total_seconds": time.monotonic() - started,
+			"succeeded": sum(1 for result in results if result["ok"]),
+			"failed": sum(1 for result in results if not result["ok"]),
+			"targets": results
+		}
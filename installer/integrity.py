@@ -0,0 +1,59 @@
+import hashlib
+import mmap
+import os
+from pathlib import Path
+
+
+class IntegrityError(Exception):
+	"""
+	Raised when a file doesn't have the SHA-256 it is supposed to have
+	"""
+	pass
+
+
+class StreamHash:
+	"""
+	SHA-256 of a file that is written front to back, fed with every chunk as it is written so the file never has to be
+	read again. Only what is already on disk (e.g. the part of a resumed download) is read, through mmap.
+	"""
+
+	def __init__(self):
+		self.hash = hashlib.sha256()
+		self.size = 0
+
+	def reset(self):
+		self.hash = hashlib.sha256()
+		self.size = 0
+
+	def update(self, data: bytes):
+		self.hash.update(data)
+		self.size += len(data)
+
+	def update_file(self, path: Path, size: int | None = None, start: int = 0):
+		"""
+		Hashes size bytes of path beginning at start, everything from start on if size is None
+		"""
+		size = os.path.getsize(path) - start if size is None else size
+		if size == 0:
+			return
+
+		with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+			with memoryview(mapped) as view, view[start:start + size] as region:
+				self.update(region)
+
+	def hexdigest(self) -> str:
+		return self.hash.hexdigest()
+
+
+def sha256_mapped(path: Path) -> str:
+	stream_hash = StreamHash()
+	stream_hash.update_file(path)
+	return stream_hash.hexdigest()
+
+
+def check_digest(actual: str, expected: str | None, name: str):
+	"""
+	Raises IntegrityError if actual isn't expected, does nothing if there is no expected digest
+	"""
+	if expected is not None and actual.lower() != expected.lower():
+		raise IntegrityError(f"{name} has SHA-256 {actual}, expected {expected}")
@@ -0,0 +1,143 @@
+import json
+import re
+import subprocess
+from pathlib import Path
+
+# CrystalStudio runs on the python of the system, not on the one the installer might be bundled with
+PYTHON = "python"
+VERSIONS_SCRIPT = """
+import json, sys
+from importlib import metadata
+versions = {}
+for name in sys.argv[1:]:
+	try:
+		versions[name] = metadata.version(name)
+	except metadata.PackageNotFoundError:
+		versions[name] = None
+print(json.dumps(versions))
+"""
+
+# name, extras and version specifier of a requirement, e.g. "requests[socks]>=2.0"
+REQUIREMENT = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)\s*(\[[^\]]*\])?\s*(.*)$")
+
+
+def parse_version(version: str) -> tuple | None:
+	"""
+	:return: the numeric parts of version, None for pre-releases, local versions and everything else that can't be
+		ordered without pip's rules (e.g. 2.0rc1 comes before 2.0)
+	"""
+	parts = version.split(".")
+	if not all(part.isdigit() for part in parts):
+		return None
+	return tuple(int(part) for part in parts)
+
+
+def satisfies(version: str, specifier: str) -> bool | None:
+	"""
+	Checks version against a specifier like ">=1.0,<2"
+	:return: whether it matches, or None if the specifier is too complex to check without pip
+	"""
+	for clause in filter(None, (c.strip() for c in specifier.split(","))):
+		match = re.match(r"^(==|!=|>=|<=|>|<)\s*([A-Za-z0-9.+-]+)$", clause)
+		if match is None or "*" in clause:
+			return None
+
+		operator, wanted = match.groups()
+		have, want = parse_version(version), parse_version(wanted)
+		if have is None or want is None:
+			return None
+		ok = {
+			"==": have == want,
+			"!=": have != want,
+			">=": have >= want,
+			"<=": have <= want,
+			">": have > want,
+			"<": have < want
+		}[operator]
+		if not ok:
+			return False
+	return True
+
+
+def installed_versions(names: list[str]) -> dict[str, str | None]:
+	"""
+	Looks up the installed version of every name in the interpreter pip installs into, None if it isn't installed.
+	That is PYTHON even if the installer itself runs on another one (a venv, python3, the py launcher or a bundle).
+	"""
+	try:
+		output = subprocess.check_output([PYTHON, "-c", VERSIONS_SCRIPT, *names])
+		return json.loads(output.decode())
+	except (OSError, subprocess.CalledProcessError, ValueError):
+		return {name: None for name in names}
+
+
+def missing_libs(libs: list[str]) -> list[str]:
+	"""
+	Filters out the libs that are already installed in a matching version, without starting pip
+	"""
+	requirements = {}
+	for lib in libs:
+		match = REQUIREMENT.match(lib)
+		# Markers and direct references are left to pip
+		if match is not None and ";" not in lib and "@" not in lib:
+			requirements[lib] = match.group(1), match.group(3)
+
+	versions = installed_versions(list({name for name, _ in requirements.values()}))
+	missing = []
+	for lib in libs:
+		if lib not in requirements:
+			missing.append(lib)
+			continue
+
+		name, specifier = requirements[lib]
+		version = versions.get(name)
+		if version is None or satisfies(version, specifier) is not True:
+			missing.append(lib)
+	return missing
+
+
+def prefetch_wheels(libs: list[str], wheelhouse: Path) -> list[str]:
+	"""
+	Downloads libs and their dependencies into wheelhouse with a single pip run, so shared dependencies are resolved
+	and downloaded once
+	:return: the libs that could not be downloaded, all of them if pip failed as it resolves them together
+	"""
+	code = subprocess.call([PYTHON, "-m", "pip", "download", "--quiet", "--dest", str(wheelhouse), *libs])
+	return [] if code == 0 else list(libs)
+
+
+def install_offline(libs: list[str], wheelhouse: Path) -> int:
+	return subprocess.call([PYTHON, "-m", "pip", "install", "--no-index", "--find-links", str(wheelhouse), *libs])
+
+
+def install_libs(libs: list[str], upgrade_pip: bool = True, wheelhouse: Path | None = None) -> int:
+	"""
+	Installs all libs with a single pip invocation, so dependencies are resolved once for the whole list.
+	Libs that are already installed in a matching version are skipped, if nothing is missing pip isn't started at all.
+	With a wheelhouse, libs are installed from there without touching the package index. Missing wheels get
+	prefetched into it first, so it fills up over time and can be seeded for machines without internet.
+	:return: pip's exit code, 0 if nothing had to be installed
+	"""
+	missing = missing_libs(libs)
+	if not missing:
+		print(f"All {len(libs)} libraries are already installed")
+		return 0
+
+	print(f"Installing {len(missing)} of {len(libs)} libraries: {missing}")
+	if wheelhouse is not None:
+		Path(wheelhouse).mkdir(parents=True, exist_ok=True)
+		if install_offline(missing, wheelhouse) == 0:
+			return 0
+
+		print(f"Wheelhouse {wheelhouse} is incomplete, prefetching wheels")
+		failed = prefetch_wheels(missing, wheelhouse)
+		if failed:
+			print(f"Could not prefetch {failed}")
+		elif install_offline(missing, wheelhouse) == 0:
+			return 0
+
+	command = [PYTHON, "-m", "pip", "install"]
+	if upgrade_pip:
+		# Upgrading pip in the same resolver pass saves an extra interpreter start
+		command += ["--upgrade", "pip"]
+	return subprocess.call(command + missing)
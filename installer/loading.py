@@ -1,16 +1,15 @@
-import json
-import os
-import shutil
 import sys
-import time
-import zipfile
+import traceback
 from pathlib import Path
-from urllib import request
 
 from PyQt6.QtCore import *
 from PyQt6.QtGui import *
 from PyQt6.QtWidgets import *
 
+from installer.download import SEGMENTS
+from installer.engine import InstallEngine, InstallError
+from installer.releases import INSTALLER_VERSION
+
 
 class QErrorDialog(QMessageBox):
 	def __init__(self, message: str = "Invalid Operation!", title: str = "Error"):
@@ -27,8 +26,12 @@ class QErrorDialog(QMessageBox):
 
 
 class InstallThread(QThread):
+	"""
+	Runs the InstallEngine off the GUI thread and forwards its progress as signals
+	"""
 	update_progress = pyqtSignal(object)
 	finish_progress = pyqtSignal(object)
+	fail_progress = pyqtSignal(object)
 
 	def __init__(
 			self,
@@ -40,131 +43,50 @@ class InstallThread(QThread):
 			password: str,
 			check_url: str,
 			register_url: str,
-			login_url: str
+			login_url: str,
+			segments: int = SEGMENTS,
+			stream_extract: bool = True,
+			installer_version: int = INSTALLER_VERSION
 	):
 		QThread.__init__(self, parent)
 		print("Initializing install thread")
-		self.create_account = create_account
-		self.save_folder = save_folder
-		self.projects_folder = projects_folder
-		self.token = None
-		self.username = username
-		self.password = password
-		self.check_url = check_url
-		self.register_url = register_url
-		self.login_url = login_url
+		self.engine = InstallEngine(
+			create_account,
+			save_folder,
+			projects_folder,
+			username,
+			password,
+			check_url,
+			register_url,
+			login_url,
+			segments=segments,
+			stream_extract=stream_extract,
+			installer_version=installer_version,
+			on_progress=self.emit_progress
+		)
 
 	def run(self):
-		print("Fixing URLs")
-		# Update URLs to correct username and password
-		self.check_url = self.check_url.replace("%username%", self.username)
-		self.check_url = self.check_url.replace("%password%", self.password)
-
-		self.register_url = self.register_url.replace("%username%", self.username)
-		self.register_url = self.register_url.replace("%password%", self.password)
-
-		self.login_url = self.login_url.replace("%username%", self.username)
-		self.login_url = self.login_url.replace("%password%", self.password)
-
 		print("Install thread: run")
-		if self.create_account:
-			print("Registering pre-emit")
-			self.update_progress.emit({"text": "Installing: Registering CrystalStudio account", "value": 10})
-			with request.urlopen(self.register_url) as resp:
-				data = json.loads(resp.read().decode())
-				if data.get("state") != "success":
-					print(f"Failed register. {self.register_url=}, {self.login_url=}, {self.check_url=}, {data=}")
-					QErrorDialog(f"Could not create account due to an error: {data.get('reason')}")
-					sys.exit(0)
-
-				self.token = data["token"]
-				secrets = {"username": self.username, "token": self.token}
-				self.dump_secrets(secrets)
-				print("Dumped secrets")
-		else:
-			print("Login pre-emit")
-			self.update_progress.emit({"text": "Logging in CrystalStudio account", "value": 10})
-			with request.urlopen(self.login_url) as resp:
-				data = json.loads(resp.read().decode())
-				if data.get("state") != "success":
-					print(f"Failed login. {self.register_url=}, {self.login_url=}, {self.check_url=}, {data=}")
-				if data.get("state") != "success":
-					QErrorDialog(f"Could not login due to an error: {data.get('reason')}")
-					sys.exit(0)
-
-				self.token = data["token"]
-				secrets = {"username": self.username, "token": self.token}
-				self.dump_secrets(secrets)
-				print("Dumped secrets")
-
-		time.sleep(0.2)  # control time
-		print(f"Created/logged into account {self.username}")
-		download_url = "https://github.com/snackbag-net/empty-installation/archive/refs/tags/test-3.zip"  # TODO: Needs to be automated (High priority)
-		unzipped_name = download_url.split("/")[4] + "-" + download_url.split("/")[8][:-4]
-		self.update_progress.emit({"text": "Installing: Preparing download", "value": 20})
-		if not os.path.exists("installation"):
-			os.mkdir("installation")
-		installation_location = Path("installation/download.zip")
-		time.sleep(0.2)  # control time
-		self.update_progress.emit({"text": "Installing: Downloading latest release...", "value": 40})
-
-		with request.urlopen(download_url) as dl_file:
-			with open(installation_location, 'wb') as out_file:
-				out_file.write(dl_file.read())
-
-		time.sleep(0.2)  # control time
-		self.update_progress.emit({"text": "Installing: Unpacking latest release...", "value": 50})
-		with zipfile.ZipFile(installation_location, "r") as zip_ref:
-			zip_ref.extractall(installation_location.parent)
-
-		time.sleep(0.2)  # control time
-		self.update_progress.emit({"text": "Installing: Setting up safe installation...", "value": 60})
-		unpacked_installation = installation_location.parent / Path(unzipped_name)
-		installation_json = json.load(open(unpacked_installation / "installation.json", "r"))
-		libs: list[str] = installation_json["libs"]
-		content: list[str] = installation_json["content"]
-
-		time.sleep(0.2)  # control time
-		self.update_progress.emit({"text": "Installing: Installing libraries...", "value": 70})
-		os.system("python -m pip install --upgrade pip")
-		for lib in libs:
-			os.system(f"python -m pip install {lib}")
-
-		time.sleep(0.2)  # control time
-		self.update_progress.emit({"text": "Installing: Installing CrystalStudio...", "value": 80})
-		for cnt in content:
-			print(f"Installing content '{cnt}'")
-			if cnt.endswith("/"):
-				if os.path.exists(cnt):
-					print("Removing original...")
-					shutil.rmtree(cnt)
-			else:
-				if os.path.exists(cnt):
-					print("Removing original...")
-					os.remove(cnt)
-
-			shutil.move(unpacked_installation / cnt, os.getcwd())
-			print(f"Finished installing content '{cnt}'")
-
-		time.sleep(0.2)  # control time
-		self.update_progress.emit({"text": "Installing: Setting up CrystalStudio...", "value": 90})
-
-		time.sleep(0.2)  # control time
-		self.update_progress.emit({"text": "Finishing...", "value": 100})
-
-		shutil.rmtree("installation")
-
-		time.sleep(0.2)  # control time
+		try:
+			self.engine.run()
+		except InstallError as e:
+			self.fail_progress.emit(str(e))
+			return
+		except Exception as e:
+			traceback.print_exc()
+			self.fail_progress.emit(f"Installation failed due to an error: {e}")
+			return
+
 		self.finish_progress.emit(None)
 
-	def dump_secrets(self, secrets: dict):
-		with open(Path(self.save_folder) / "secrets.json", "w") as f:
-			json.dump(secrets, f, indent=4)
+	def emit_progress(self, text: str, value: int):
+		self.update_progress.emit({"text": text, "value": value})
 
 
 class Window(QWidget):
 	def __init__(self, app: QApplication, create_account: bool, save_folder: Path, projects_folder: Path, username: str,
-	             password: str, check_url: str, register_url: str, login_url: str):
+	             password: str, check_url: str, register_url: str, login_url: str,
+	             installer_version: int = INSTALLER_VERSION):
 		super().__init__()
 		self.app = app
 		self.theme = """
@@ -220,9 +142,13 @@ QProgressBar::chunk {
 
 		self.show()
 
-		install_thread = InstallThread(self, create_account, save_folder, projects_folder, username, password, check_url, register_url, login_url)
+		install_thread = InstallThread(
+			self, create_account, save_folder, projects_folder, username, password, check_url, register_url, login_url,
+			installer_version=installer_version
+		)
 		install_thread.update_progress.connect(self.update_progress)
 		install_thread.finish_progress.connect(self.finish_progress)
+		install_thread.fail_progress.connect(self.fail_progress)
 		install_thread.start()
 
 	def update_progress(self, args: dict):
@@ -231,6 +157,11 @@ QProgressBar::chunk {
 		self.activity_title.adjustSize()
 		print(f"updating to {args['text']} - {args['value']}")
 
+	def fail_progress(self, message: str):
+		print(f"Installation failed: {message}")
+		QErrorDialog(message)
+		sys.exit(0)
+
 	def finish_progress(self):
 		print("Finished installation")
 		self.hide()
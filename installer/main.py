@@ -1,23 +1,101 @@
 import json
-import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPException, InvalidURL
+from urllib.error import URLError
 
+from PyQt6.QtCore import *
 from PyQt6.QtWidgets import *
 from PyQt6.QtGui import *
-from installer.loading import Window as LoadingUI
-from urllib import request
-from pathlib import Path
-import webbrowser
+from installer.metacache import MetadataCache
+from installer.net import urlopen
+from installer.paths import default_folders
+from installer.profiling import NullProfiler
+from installer.releases import INSTALLER_VERSION
+from installer.urls import CHANNELS_URL, CHECK_URL, INSTALLER_URL, LOGIN_URL, REGISTER_URL, USER_URL
+
+ACCOUNT_TIMEOUT = 10
 
 
 def is_wifi_on() -> bool:
 	try:
-		request.urlopen('https://extras.snackbag.net/', timeout=1)
+		# Read the answer, so the connection stays open for the next requests to the server
+		with urlopen('https://extras.snackbag.net/', timeout=1) as resp:
+			resp.read()
 		return True
 	except:
 		return False
 
 
+def fetch_latest_version(installer_url: str, save_folder) -> int:
+	print(f"Checking for latest version at {installer_url}")
+	cache = MetadataCache.of_save_folder(save_folder)
+	data = json.loads(cache.fetch(installer_url).decode())
+	return data['ver']
+
+
+def prefetch_channels(save_folder):
+	"""
+	Fills the metadata cache with the release channels, so resolving the release during the install needs no request
+	"""
+	MetadataCache.of_save_folder(save_folder).fetch(CHANNELS_URL)
+
+
+class StartupChecks(QThread):
+	"""
+	Runs the connectivity and version checks and prefetches the release channels at the same time, without blocking
+	the wizard from showing up
+	"""
+	checks_done = pyqtSignal(object)
+
+	def __init__(self, parent, installer_url: str, save_folder):
+		QThread.__init__(self, parent)
+		self.installer_url = installer_url
+		self.save_folder = save_folder
+
+	def run(self):
+		with ThreadPoolExecutor(max_workers=3) as pool:
+			online = pool.submit(is_wifi_on)
+			latest = pool.submit(fetch_latest_version, self.installer_url, self.save_folder)
+			channels = pool.submit(prefetch_channels, self.save_folder)
+
+			result = {"online": online.result(), "latest": None}
+			try:
+				result["latest"] = latest.result()
+			except Exception as e:
+				print(f"Could not check for latest version: {e}")
+
+			# The wizard doesn't need the channels, so it isn't kept waiting for them
+			self.checks_done.emit(result)
+			try:
+				channels.result()
+			except Exception as e:
+				print(f"Could not prefetch release channels: {e}")
+
+
+class RequestWorker(QThread):
+	"""
+	Runs a single JSON request off the GUI thread
+	"""
+	answered = pyqtSignal(object)
+
+	def __init__(self, parent, request_id: int, url: str, timeout: float = ACCOUNT_TIMEOUT):
+		QThread.__init__(self, parent)
+		self.request_id = request_id
+		self.url = url
+		self.timeout = timeout
+
+	def run(self):
+		result = {"id": self.request_id, "data": None, "error": None}
+		try:
+			with urlopen(self.url, timeout=self.timeout, decode=True) as resp:
+				result["data"] = json.loads(resp.read().decode())
+		except Exception as e:
+			result["error"] = e
+		self.answered.emit(result)
+
+
 class QHLine(QFrame):
 	def __init__(self):
 		super(QHLine, self).__init__()
@@ -42,7 +120,9 @@ class QErrorDialog(QMessageBox):
 class Window(QWidget):
 	def __init__(self, app_: QApplication):
 		super().__init__()
-		self.version = 1
+		started = time.perf_counter()
+		self.app = app_
+		self.version = INSTALLER_VERSION
 		self.method_create_account = None
 
 		self.w = None
@@ -50,50 +130,42 @@ class Window(QWidget):
 		self.save_folder = None
 		self.project_folder = None
 
-		self.check_url = f"https://extras.snackbag.net/crystal/register/validate?username=%username%&password=%password%"
-		self.register_url = f"https://extras.snackbag.net/crystal/register?username=%username%&password=%password%"
-		self.installer_url = f"https://raw.githubusercontent.com/snackbag-net/CrystalStudio-Installer/main/installer/installer.json"
-		self.login_url = f"http://extras.snackbag.net/crystal/login?username=%username%&password=%password%"
+		self.check_url = CHECK_URL
+		self.register_url = REGISTER_URL
+		self.installer_url = INSTALLER_URL
+		self.login_url = LOGIN_URL
 
-		if not is_wifi_on():
-			QErrorDialog("The installer needs to be connected to the internet to install")
-			sys.exit()
+		# None until the startup checks are done, Next stays disabled until then
+		self.online = None
 
-		self.check_latest_version()
+		# Background requests, only the answer to the latest request_id is used
+		self.request_id = 0
+		self.workers = []
+		self.pending_button = None
+		self.pending_text = None
 
 		if sys.platform not in ["darwin", "win32"]:
 			QErrorDialog("Unsupported operating system! If you are using Linux, try to clone the GitHub repository instead of using the installer")
 
 		self.mk_default_folders()
 
-		self.pages = []
 		self.page_data = ["Welcome to the CrystalStudio Setup", "Choose save folder", "Choose project folder",
 		                  "Installation Options", "CrystalStudio Account"]
 		self.current_page = 0
 		self.build_default()
 		self.switch_page(0)
+		print(f"Built setup wizard in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+		self.startup_checks = StartupChecks(self, self.installer_url, self.save_folder)
+		self.startup_checks.checks_done.connect(self.apply_startup_checks)
+		self.startup_checks.start()
 
 		self.developer_shortcut = QShortcut("Shift+Alt+D", self)
 		self.developer_shortcut.activated.connect(self.enable_devmode)
 
 	def mk_default_folders(self):
 		# Save and projects folder
-		if sys.platform == "darwin":
-			self.save_folder = os.path.expanduser("~/Library/Application Support/SnackBag/CrystalStudio/")
-			Path(self.save_folder).mkdir(parents=True, exist_ok=True)
-
-			self.project_folder = os.path.expanduser("~/CrystalProjects/")
-			Path(self.project_folder).mkdir(parents=True, exist_ok=True)
-		elif sys.platform == "win32":
-			self.save_folder = Path(Path(os.getenv('APPDATA')) / Path("/SnackBag/CrystalStudio/"))
-			self.save_folder.mkdir(parents=True, exist_ok=True)
-
-			self.project_folder = os.path.expanduser("~/CrystalProjects/")
-			Path(self.project_folder).mkdir(parents=True, exist_ok=True)
-		else:
-			self.save_folder = Path("/")
-			self.project_folder = os.path.expanduser("~/CrystalProjects/")
-			Path(self.project_folder).mkdir(parents=True, exist_ok=True)
+		self.save_folder, self.project_folder = default_folders()
 
 	def build_default(self):
 		style_title = "font-size: 24px; font-weight: bold;"
@@ -120,7 +192,6 @@ class Window(QWidget):
 		side_layout.addLayout(self.layout)
 
 		self.build_pages()
-		self.layout.addStretch()
 
 		btns_layout = QHBoxLayout(self)
 		self.layout.addLayout(btns_layout)
@@ -137,79 +208,72 @@ class Window(QWidget):
 		btns_layout.addWidget(self.next_btn)
 
 	def build_pages(self):
-		style_title = "font-size: 14px; font-weight: 500;"
-
-		# Page 1 (0)
-		self.pages.append([])
-		page: list = self.pages[0]
-
+		# Pages are only built the first time they are shown, see show_page
+		self.page_builders = [self.build_welcome_page, self.build_save_folder_page, self.build_project_folder_page,
+		                      self.build_options_page, self.build_account_page]
+		self.page_widgets = {}
+		self.stack = QStackedWidget()
+		self.layout.addWidget(self.stack)
+
+	def ensure_page(self, page: int) -> QWidget:
+		if page not in self.page_widgets:
+			started = time.perf_counter()
+			widget = QWidget()
+			layout = QVBoxLayout(widget)
+			layout.setContentsMargins(0, 0, 0, 0)
+			self.page_builders[page](layout)
+			layout.addStretch()
+
+			self.page_widgets[page] = widget
+			self.stack.addWidget(widget)
+			print(f"Built page {page} in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+		return self.page_widgets[page]
+
+	def show_page(self, page: int):
+		self.stack.setCurrentWidget(self.ensure_page(page))
+
+	def build_welcome_page(self, layout: QVBoxLayout):
 		text = QLabel(
 			"Setup will guide you through the installation of CrystalStudio.\n\nIt is recommended that you close all other applications before starting Setup. This will make it possible to update relevant system files without having to reboot your computer.\n\nClick Next to continue.")
 		text.setWordWrap(True)
 		text.adjustSize()
-		text.hide()
-		self.layout.addWidget(text)
-
-		page.append(text)
-
-		# Page 2 (1)
-		self.pages.append([])
-		page: list = self.pages[1]
+		layout.addWidget(text)
 
+	def build_save_folder_page(self, layout: QVBoxLayout):
 		text2 = QLabel(
 			"Setup will save CrystalStudio addons and other data in the following folder. To select a different folder, click Browse and select another folder.\n\nNote: this is not the folder where CrystalStudio will be installed in!\n\nClick Next to continue.\n")
 		text2.setWordWrap(True)
 		text2.adjustSize()
-		text2.hide()
-		self.layout.addWidget(text2)
+		layout.addWidget(text2)
 
 		save_folder_l = QHBoxLayout()
-		self.layout.addLayout(save_folder_l)
-		self.save_folder_i = QLineEdit(self.save_folder)
-		self.save_folder_i.hide()
+		layout.addLayout(save_folder_l)
+		self.save_folder_i = QLineEdit(str(self.save_folder))
 		save_folder_l.addWidget(self.save_folder_i)
 		save_folder_b = QPushButton("Browse")
 		save_folder_b.clicked.connect(self.update_save_folder)
-		save_folder_b.hide()
 		save_folder_l.addWidget(save_folder_b)
 
-		page.append(text2)
-		page.append(self.save_folder_i)
-		page.append(save_folder_b)
-
-		# Page 3 (2)
-		self.pages.append([])
-		page: list = self.pages[2]
-
+	def build_project_folder_page(self, layout: QVBoxLayout):
 		text3 = QLabel(
 			"Setup will save CrystalStudio projects in the following folder. To select a different folder, click Browse and select another folder.\n\nNote: this is not the folder where CrystalStudio will be installed in!\n\nClick Next to continue.")
 		text3.setWordWrap(True)
 		text3.adjustSize()
-		text3.hide()
-		self.layout.addWidget(text3)
+		layout.addWidget(text3)
 
 		project_folder_l = QHBoxLayout()
-		self.layout.addLayout(project_folder_l)
+		layout.addLayout(project_folder_l)
 		self.project_folder_i = QLineEdit(self.project_folder)
-		self.project_folder_i.hide()
 		project_folder_l.addWidget(self.project_folder_i)
 		project_folder_b = QPushButton("Browse")
 		project_folder_b.clicked.connect(self.update_project_folder)
-		project_folder_b.hide()
 		project_folder_l.addWidget(project_folder_b)
 
-		page.append(text3)
-		page.append(self.project_folder_i)
-		page.append(project_folder_b)
-
-		# Page 4 (3)
-		self.pages.append([])
-		page: list = self.pages[3]
-
+	def build_options_page(self, layout: QVBoxLayout):
 		g1_title = QLabel("Create Desktop Shortcut (Windows-only)")
 		g1_title.adjustSize()
-		g1_title.hide()
-		self.layout.addWidget(g1_title)
+		layout.addWidget(g1_title)
 
 		g1_hbox = QHBoxLayout()
 		g1_check = QCheckBox()
@@ -218,68 +282,42 @@ class Window(QWidget):
 		if sys.platform != 'win32':
 			g1_check.setDisabled(True)
 
-		g1_check.hide()
 		g1_text = QLabel("CrystalStudio")
-		g1_text.hide()
 		g1_hbox.addWidget(g1_check)
 		g1_hbox.addWidget(g1_text)
 		g1_hbox.addStretch()
-		self.layout.addLayout(g1_hbox)
-
-		page.append(g1_title)
-		page.append(g1_check)
-		page.append(g1_text)
+		layout.addLayout(g1_hbox)
 
 		g2_title = QLabel("Install optional default addons")
 		g2_title.adjustSize()
-		g2_title.hide()
 		g2_line = QHLine()
-		g2_line.hide()
-		self.layout.addWidget(g2_line)
-		self.layout.addWidget(g2_title)
+		layout.addWidget(g2_line)
+		layout.addWidget(g2_title)
 
 		g2_hbox = QHBoxLayout()
 		g2_check = QCheckBox()
 		g2_check.setChecked(True)
 
-		g2_check.hide()
 		g2_text = QLabel("Discord Integration")
-		g2_text.hide()
 		g2_hbox.addWidget(g2_check)
 		g2_hbox.addWidget(g2_text)
 		g2_hbox.addStretch()
-		self.layout.addLayout(g2_hbox)
+		layout.addLayout(g2_hbox)
 
 		g2_hbox2 = QHBoxLayout()
 		g2_check2 = QCheckBox()
 		g2_check2.setChecked(True)
 
-		g2_check2.hide()
 		g2_text2 = QLabel("Game2D Generator")
-		g2_text2.hide()
 		g2_hbox2.addWidget(g2_check2)
 		g2_hbox2.addWidget(g2_text2)
 		g2_hbox2.addStretch()
-		self.layout.addLayout(g2_hbox2)
-
-		page.append(g2_title)
-		page.append(g2_check)
-		page.append(g2_text)
-		page.append(g2_line)
-
-		page.append(g2_check2)
-		page.append(g2_text2)
-
-		# Page 5 (4)
-		self.pages.append([])
-		page: list = self.pages[4]
+		layout.addLayout(g2_hbox2)
 
+	def build_account_page(self, layout: QVBoxLayout):
 		acc_info = QLabel("An account is needed to install addons, publish addons or games, use coop mode and much more! It will be hard to change this data after, so be careful.\n\nPress Finish to create or login to the account and install CrystalStudio. Don't forget to press Check first!\n")
 		acc_info.setWordWrap(True)
-		self.layout.addWidget(acc_info)
-
-		acc_info.hide()
-		page.append(acc_info)
+		layout.addWidget(acc_info)
 
 		tab_wgt1 = QWidget()
 		tab_layout1 = QVBoxLayout()
@@ -289,89 +327,61 @@ class Window(QWidget):
 		tab_wgt2.setLayout(tab_layout2)
 
 		# Tab 1
-		acc1_layout = QHBoxLayout(self)
+		acc1_layout = QHBoxLayout()
 		acc1_l = QLabel("Username")
-		acc1_l.hide()
 		self.acc1_i = QLineEdit()
-		self.acc1_i.hide()
 		acc1_layout.addWidget(acc1_l)
 		acc1_layout.addWidget(self.acc1_i)
 		tab_layout1.addLayout(acc1_layout)
 
-		page.append(acc1_l)
-		page.append(self.acc1_i)
-
-		acc2_layout = QHBoxLayout(self)
+		acc2_layout = QHBoxLayout()
 		acc2_l = QLabel("Password")
-		acc2_l.hide()
 		self.acc2_i = QLineEdit()
 		self.acc2_i.setEchoMode(QLineEdit.EchoMode.Password)
-		self.acc2_i.hide()
 		acc2_layout.addWidget(acc2_l)
 		acc2_layout.addWidget(self.acc2_i)
 		tab_layout1.addLayout(acc2_layout)
 
-		page.append(acc2_l)
-		page.append(self.acc2_i)
-
-		acc3_layout = QHBoxLayout(self)
+		acc3_layout = QHBoxLayout()
 		acc3_l = QLabel("Repeat password")
-		acc3_l.hide()
 		self.acc3_i = QLineEdit()
 		self.acc3_i.setEchoMode(QLineEdit.EchoMode.Password)
-		self.acc3_i.hide()
 		acc3_layout.addWidget(acc3_l)
 		acc3_layout.addWidget(self.acc3_i)
 		tab_layout1.addLayout(acc3_layout)
 
 		self.check_btn = QPushButton("Check")
 		self.check_btn.pressed.connect(self.check_userdata)
-		self.check_btn.hide()
 		tab_layout1.addWidget(self.check_btn)
 
-		page.append(acc3_l)
-		page.append(self.acc3_i)
-		page.append(self.check_btn)
-
 		# Tab 2
-		login_acc1_layout = QHBoxLayout(self)
+		login_acc1_layout = QHBoxLayout()
 		login_acc1_l = QLabel("Username")
-		login_acc1_l.hide()
 		self.login_acc1_i = QLineEdit()
-		self.login_acc1_i.hide()
 		login_acc1_layout.addWidget(login_acc1_l)
 		login_acc1_layout.addWidget(self.login_acc1_i)
 		tab_layout2.addLayout(login_acc1_layout)
 
-		page.append(login_acc1_l)
-		page.append(self.login_acc1_i)
-
-		login_acc2_layout = QHBoxLayout(self)
+		login_acc2_layout = QHBoxLayout()
 		login_acc2_l = QLabel("Password")
-		login_acc2_l.hide()
 		self.login_acc2_i = QLineEdit()
 		self.login_acc2_i.setEchoMode(QLineEdit.EchoMode.Password)
-		self.login_acc2_i.hide()
 		login_acc2_layout.addWidget(login_acc2_l)
 		login_acc2_layout.addWidget(self.login_acc2_i)
 		tab_layout2.addLayout(login_acc2_layout)
 
-		page.append(login_acc2_l)
-		page.append(self.login_acc2_i)
-
 		self.login_check_btn = QPushButton("Check")
 		self.login_check_btn.pressed.connect(self.check_userdata_login)
-		self.login_check_btn.hide()
-		page.append(self.login_check_btn)
 		tab_layout2.addWidget(self.login_check_btn)
 
 		self.tabs = QTabWidget()
 		self.tabs.addTab(tab_wgt1, "Register")
 		self.tabs.addTab(tab_wgt2, "Login")
-		self.tabs.hide()
+		layout.addWidget(self.tabs)
 
-		page.append(self.tabs)
-		self.layout.addWidget(self.tabs)
+		# Changing the account data makes a running check outdated
+		for field in [self.acc1_i, self.acc2_i, self.acc3_i, self.login_acc1_i, self.login_acc2_i]:
+			field.textChanged.connect(self.cancel_request)
 
 	def check_userdata(self):
 		username = self.acc1_i.text()
@@ -385,27 +395,7 @@ class Window(QWidget):
 		check_url = self.check_url
 		check_url = check_url.replace("%username%", username)
 		check_url = check_url.replace("%password%", pw1)
-		try:
-			with request.urlopen(check_url) as resp:
-				raw_data = resp.read().decode()
-				data = json.loads(raw_data)
-				print(f"Received answer from server: {data}")
-				if data.get("state") is None:
-					QErrorDialog("Something went wrong! Try again later. ('state' is None)")
-					return
-
-				state = data["state"]
-				if state == "error":
-					QErrorDialog(data["reason"])
-				else:
-					self.check_btn.setDisabled(True)
-					self.login_check_btn.setDisabled(True)
-					self.tabs.setDisabled(True)
-					self.next_btn.setEnabled(True)
-
-					self.method_create_account = True
-		except:
-			QErrorDialog("You can't use those characters")
+		self.start_request(check_url, self.check_btn, lambda result: self.userdata_checked(result, True))
 
 	def check_userdata_login(self):
 		username = self.login_acc1_i.text()
@@ -414,83 +404,143 @@ class Window(QWidget):
 		check_url = self.login_url
 		check_url = check_url.replace("%username%", username)
 		check_url = check_url.replace("%password%", pw)
-		try:
-			with request.urlopen(check_url) as resp:
-				raw_data = resp.read().decode()
-				data = json.loads(raw_data)
-				print(f"Received answer from server: {data}")
-				if data.get("state") is None:
-					QErrorDialog("Something went wrong! Try again later. ('state' is None)")
-					return
-
-				state = data["state"]
-				if state == "error":
-					QErrorDialog(data["reason"])
-				else:
-					self.check_btn.setDisabled(True)
-					self.login_check_btn.setDisabled(True)
-					self.tabs.setDisabled(True)
-					self.next_btn.setEnabled(True)
-
-					self.method_create_account = False
-		except:
-			QErrorDialog("You can't use those characters")
+		self.start_request(check_url, self.login_check_btn, lambda result: self.userdata_checked(result, False))
+
+	def userdata_checked(self, result: dict, create_account: bool):
+		error = result["error"]
+		if error is not None:
+			print(f"Account check failed: {error!r}")
+			# Characters that can't be put into the URL fail before anything is sent
+			if isinstance(error, (URLError, TimeoutError, HTTPException, ConnectionError)) \
+					and not isinstance(error, InvalidURL):
+				QErrorDialog(f"Could not reach the account server, check your connection and try again. ({error})")
+			else:
+				QErrorDialog("You can't use those characters")
+			return
 
-	def switch_page(self, page: int):
-		for elem in self.pages[self.current_page]:
-			elem.hide()
+		data = result["data"]
+		print(f"Received answer from server: {data}")
+		if data.get("state") is None:
+			QErrorDialog("Something went wrong! Try again later. ('state' is None)")
+			return
 
-		self.current_page = page
+		state = data["state"]
+		if state == "error":
+			QErrorDialog(data["reason"])
+		else:
+			self.check_btn.setDisabled(True)
+			self.login_check_btn.setDisabled(True)
+			self.tabs.setDisabled(True)
+			self.next_btn.setEnabled(True)
 
-		user_url = "https://extras.snackbag.net/crystal/get/"
-		if self.current_page >= len(self.pages):
+			self.method_create_account = create_account
+
+	def start_request(self, url: str, button: QPushButton, callback):
+		"""
+		Runs a request against the account server in the background, showing button as pending until it's answered
+		:param callback: called on the GUI thread with {"data": ..., "error": ...}, unless the request got cancelled
+		"""
+		if self.pending_button is not None:
+			# A check is already running, coalesce repeated clicks into it
+			return
+
+		self.request_id += 1
+		self.pending_button = button
+		self.pending_text = button.text()
+		button.setText("Checking...")
+		button.setDisabled(True)
+
+		worker = RequestWorker(self, self.request_id, url)
+		worker.answered.connect(lambda result: self.request_answered(result, callback))
+		worker.finished.connect(lambda: self.workers.remove(worker))
+		self.workers.append(worker)
+		worker.start()
+
+	def request_answered(self, result: dict, callback):
+		if result["id"] != self.request_id:
+			print(f"Ignoring answer of cancelled request {result['id']}")
+			return
+
+		self.reset_pending()
+		callback(result)
+
+	def cancel_request(self):
+		# The thread can't be interrupted, but its answer will be ignored
+		if self.pending_button is not None:
+			self.request_id += 1
+			self.reset_pending()
+
+	def reset_pending(self):
+		if self.pending_button is None:
+			return
+
+		self.pending_button.setText(self.pending_text)
+		self.pending_button.setEnabled(True)
+		self.pending_button = None
+
+	def switch_page(self, page: int):
+		if page >= len(self.page_builders):
 			print("Installing")
-			if self.method_create_account:
-				username = json.loads(request.urlopen(user_url + self.acc1_i.text()).read().decode())["data"]["username"]
-				password = self.acc2_i.text()
-			else:
-				username = json.loads(request.urlopen(user_url + self.login_acc1_i.text()).read().decode())["data"]["username"]
-				password = self.login_acc2_i.text()
-
-			self.hide()
-			self.w = LoadingUI(
-				app,
-				self.method_create_account,
-				self.save_folder,
-				self.project_folder,
-				username,
-				password,
-				self.check_url,
-				self.register_url,
-				self.login_url
-			)
-			self.w.show()
+			# The wizard stays on the last page until the account has been looked up
+			username = self.acc1_i.text() if self.method_create_account else self.login_acc1_i.text()
+			self.start_request(USER_URL + username, self.next_btn, self.start_install)
 			return
 
-		if self.current_page >= len(self.pages) - 1:
+		self.current_page = page
+
+		if self.current_page >= len(self.page_builders) - 1:
 			self.next_btn.setText("Finish")
 			self.next_btn.setDisabled(True)
 
-		if self.current_page < len(self.pages) - 1:
+		if self.current_page < len(self.page_builders) - 1:
 			self.next_btn.setText("Next")
-			self.next_btn.setEnabled(True)
+			self.next_btn.setEnabled(self.online is True)
 
 		if self.current_page <= 0:
 			self.back_btn.setDisabled(True)
 		else:
 			self.back_btn.setDisabled(False)
 
-		for elem in self.pages[page]:
-			elem.show()
+		self.show_page(page)
 
 		self.title.setText(self.page_data[page])
 
+	def start_install(self, result: dict):
+		if result["error"] is not None:
+			QErrorDialog(f"Could not look up the account: {result['error']}")
+			return
+
+		username = result["data"]["data"]["username"]
+		password = self.acc2_i.text() if self.method_create_account else self.login_acc2_i.text()
+
+		from installer.loading import Window as LoadingUI
+
+		self.hide()
+		self.w = LoadingUI(
+			self.app,
+			self.method_create_account,
+			self.save_folder,
+			self.project_folder,
+			username,
+			password,
+			self.check_url,
+			self.register_url,
+			self.login_url,
+			installer_version=self.version
+		)
+		self.w.show()
+
 	def next_page(self):
 		self.switch_page(self.current_page + 1)
 
 	def last_page(self):
 		self.switch_page(self.current_page - 1)
 
+	def dev_check_userdata(self):
+		# The account fields only exist once the account page has been built
+		self.ensure_page(len(self.page_builders) - 1)
+		self.check_userdata()
+
 	def enable_devmode(self):
 		def update_vars(din1: QLineEdit, din2: QLineEdit, din3: QLineEdit, din4: QLineEdit):
 			self.check_url = din1.text()
@@ -542,21 +592,31 @@ class Window(QWidget):
 		dub = QPushButton(dialog)
 		dub.move(160, 280)
 		dub.setText("CUD()")
-		dub.clicked.connect(self.check_userdata)
+		dub.clicked.connect(self.dev_check_userdata)
 
 		dialog.exec()
 
+	def apply_startup_checks(self, result: dict):
+		if not result["online"]:
+			QErrorDialog("The installer needs to be connected to the internet to install")
+			sys.exit()
+
+		self.online = True
+		if self.current_page < len(self.page_builders) - 1:
+			self.next_btn.setEnabled(True)
+
+		if result["latest"] is not None:
+			self.apply_latest_version(result["latest"])
+
 	def check_latest_version(self):
-		print(f"Checking for latest version at {self.installer_url}")
-		with request.urlopen(self.installer_url) as resp:
-			raw_data = resp.read()
-			data = json.loads(raw_data.decode())
+		self.apply_latest_version(fetch_latest_version(self.installer_url, self.save_folder))
 
-			if self.version < data['ver']:
-				QErrorDialog("Installer is outdated. Please install new version!")
-				print("[INFO]")
-				print("Outdated installer, no support.")
-				print("[INFO]")
+	def apply_latest_version(self, latest: int):
+		if self.version < latest:
+			QErrorDialog("Installer is outdated. Please install new version!")
+			print("[INFO]")
+			print("Outdated installer, no support.")
+			print("[INFO]")
 
 	def update_save_folder(self):
 		self.save_folder = str(QFileDialog.getExistingDirectory(self, "Select Directory", self.save_folder))
@@ -567,9 +627,23 @@ class Window(QWidget):
 		self.project_folder_i.setText(self.project_folder)
 
 
-app = QApplication(sys.argv)
+def main(argv: list[str] | None = None, profiler=None) -> int:
+	"""
+	Starts the setup wizard and runs the Qt event loop until the installer quits
+	:param argv: command line arguments for Qt, defaults to sys.argv
+	:param profiler: records startup timings, see installer.profiling
+	:return: exit code of the event loop
+	"""
+	profiler = profiler or NullProfiler()
+
+	with profiler.span("create QApplication"):
+		app = QApplication(sys.argv if argv is None else argv)
 
-window = Window(app)
-window.show()
+	with profiler.span("build and show Window"):
+		window = Window(app)
+		window.show()
 
-sys.exit(app.exec())
+	# The first event loop iteration happens once the window has been painted
+	started = time.perf_counter()
+	QTimer.singleShot(0, lambda: (profiler.mark("first paint", started), profiler.dump()))
+	return app.exec()
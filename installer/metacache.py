@@ -0,0 +1,93 @@
+import hashlib
+import http.client
+import json
+import os
+import time
+from pathlib import Path
+from urllib import request
+from urllib.error import URLError
+
+from installer.net import urlopen
+
+TTL = 10 * 60
+TIMEOUT = 5
+
+
+class MetadataCache:
+	"""
+	On-disk cache for small metadata files like installer.json. Within the TTL the cached copy is used without any
+	request, after that it is revalidated with If-None-Match/If-Modified-Since, so an unchanged file costs a 304.
+	If the server is slow or unreachable, the cached copy is used no matter how old it is.
+	"""
+
+	def __init__(self, root: Path, ttl: float = TTL, timeout: float = TIMEOUT):
+		self.root = Path(root)
+		self.ttl = ttl
+		self.timeout = timeout
+		self.root.mkdir(parents=True, exist_ok=True)
+
+	@classmethod
+	def of_save_folder(cls, save_folder: Path) -> "MetadataCache":
+		"""
+		The cache shared by the version check and the release resolver
+		"""
+		return cls(Path(save_folder) / "cache" / "metadata")
+
+	def path_of(self, url: str) -> Path:
+		return self.root / f"{hashlib.sha256(url.encode()).hexdigest()}.json"
+
+	def load(self, url: str) -> dict | None:
+		try:
+			with open(self.path_of(url), "r") as f:
+				entry = json.load(f)
+		except (OSError, ValueError):
+			return None
+		return entry if entry.get("url") == url else None
+
+	def dump(self, entry: dict):
+		path = self.path_of(entry["url"])
+		tmp_path = path.with_suffix(".tmp")
+		with open(tmp_path, "w") as f:
+			json.dump(entry, f, indent=4)
+		os.replace(tmp_path, path)
+
+	def fetch(self, url: str, max_age: float | None = None) -> bytes:
+		"""
+		Returns the body of url, from the cache if possible
+		:param max_age: overrides the TTL, 0 always revalidates
+		"""
+		max_age = self.ttl if max_age is None else max_age
+		entry = self.load(url)
+		if entry is not None and time.time() - entry["fetched_at"] < max_age:
+			print(f"Using cached {url}")
+			return entry["body"].encode()
+
+		req = request.Request(url)
+		if entry is not None:
+			if entry.get("etag"):
+				req.add_header("If-None-Match", entry["etag"])
+			if entry.get("last_modified"):
+				req.add_header("If-Modified-Since", entry["last_modified"])
+
+		try:
+			with urlopen(req, timeout=self.timeout, decode=True) as resp:
+				body = resp.read()
+				if resp.status == 304 and entry is not None:
+					print(f"{url} not modified")
+					entry["fetched_at"] = time.time()
+					self.dump(entry)
+					return entry["body"].encode()
+
+				self.dump({
+					"url": url,
+					"etag": resp.headers.get("ETag"),
+					"last_modified": resp.headers.get("Last-Modified"),
+					"fetched_at": time.time(),
+					"body": body.decode()
+				})
+				return body
+		except (URLError, OSError, http.client.HTTPException) as e:
+			if entry is None:
+				raise
+			print(f"Could not fetch {url} ({e}), using cached copy")
+			return entry["body"].encode()
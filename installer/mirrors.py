@@ -0,0 +1,276 @@
+import http.client
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib import request
+from urllib.error import URLError
+
+from installer.download import CHUNK_SIZE, RETRIES, RETRY_DELAY, TIMEOUT, PartialFile, Progress, \
+	content_range_start, content_range_total
+from installer.integrity import StreamHash
+from installer.net import urlopen
+
+PROBE_BYTES = 64 * 1024
+PROBE_TIMEOUT = 5
+PROBE_WORKERS = 8
+# How long probe results are trusted before mirrors are probed again
+PROBE_TTL = 60 * 60
+# Size mirrors are ranked for if the size of the release isn't known
+RANK_SIZE = 16 * 1024 * 1024
+# Throughput is measured over windows this long (in seconds) while downloading
+SPEED_WINDOW = 3.0
+# A mirror is given up on once a window is this much slower than the fastest window of the transfer
+COLLAPSE_RATIO = 0.2
+# Seconds without any data before a mirror is given up on, if there are others to switch to
+STALL_TIMEOUT = 10
+
+
+class SlowMirror(Exception):
+	"""
+	Raised when the throughput of a mirror collapses during a transfer
+	"""
+	pass
+
+
+def probe_mirror(url: str, timeout: float = PROBE_TIMEOUT) -> dict:
+	"""
+	Reads the first PROBE_BYTES of url
+	:return: dict with ok, latency (seconds until the response started) and throughput (bytes per second)
+	"""
+	started = time.monotonic()
+	try:
+		req = request.Request(url, headers={"Range": f"bytes=0-{PROBE_BYTES - 1}"})
+		with urlopen(req, timeout=timeout) as resp:
+			responded = time.monotonic()
+			data = resp.read(PROBE_BYTES)
+			finished = time.monotonic()
+	except (URLError, OSError, http.client.HTTPException) as e:
+		print(f"Mirror {url} failed its probe: {e}")
+		return {"ok": False, "latency": None, "throughput": None, "probed_at": time.time()}
+
+	# Responses that fit into the first packet arrive with the headers
+	elapsed = finished - responded if finished - responded > 0.001 else finished - started
+	return {
+		"ok": True,
+		"latency": responded - started,
+		"throughput": len(data) / elapsed if elapsed > 0 else float(len(data)),
+		"probed_at": time.time()
+	}
+
+
+class MirrorProbes:
+	"""
+	Probe results of mirrors, kept on disk for PROBE_TTL so the next install doesn't have to probe again
+	"""
+
+	def __init__(self, path: Path, ttl: float = PROBE_TTL):
+		self.path = Path(path)
+		self.ttl = ttl
+		self.results = self.load()
+
+	def load(self) -> dict:
+		try:
+			with open(self.path, "r") as f:
+				return json.load(f)
+		except (OSError, ValueError):
+			return {}
+
+	def dump(self):
+		self.path.parent.mkdir(parents=True, exist_ok=True)
+		tmp_path = self.path.with_suffix(".tmp")
+		with open(tmp_path, "w") as f:
+			json.dump(self.results, f, indent=4)
+		os.replace(tmp_path, self.path)
+
+	def fresh(self, url: str) -> dict | None:
+		result = self.results.get(url)
+		if result is None or time.time() - result["probed_at"] > self.ttl:
+			return None
+		return result
+
+	def record_failure(self, url: str):
+		"""
+		Ranks url last until it is probed again
+		"""
+		self.results[url] = {"ok": False, "latency": None, "throughput": None, "probed_at": time.time()}
+		self.dump()
+
+	def rank(self, mirrors: list[str], size: int | None = None, workers: int = PROBE_WORKERS) -> list[str]:
+		"""
+		Probes every mirror without a fresh result at the same time
+		:param size: size of the file, mirrors are ranked by the time they'd need for it
+		:return: mirrors from fastest to slowest, the ones that failed at the end
+		"""
+		unknown = [url for url in mirrors if self.fresh(url) is None]
+		if unknown:
+			with ThreadPoolExecutor(max_workers=min(workers, len(unknown))) as pool:
+				for url, result in zip(unknown, pool.map(probe_mirror, unknown)):
+					self.results[url] = result
+			self.dump()
+
+		def estimated_time(url: str) -> float:
+			result = self.results[url]
+			if not result["ok"]:
+				return float("inf")
+			return result["latency"] + (size or RANK_SIZE) / max(result["throughput"], 1.0)
+
+		ranked = sorted(mirrors, key=estimated_time)
+		print("Ranked mirrors: " + ", ".join(
+			f"{url} ({estimated_time(url):.1f} s)" for url in ranked
+		))
+		return ranked
+
+
+class MirrorStream:
+	"""
+	Reads one file from a list of mirrors. If a mirror fails or its throughput collapses mid-transfer, reading goes on
+	from the next one with a Range request at the current position, so nothing is downloaded twice.
+	"""
+
+	def __init__(self, mirrors: list[str], total: int | None = None, retries: int = RETRIES,
+	             window: float = SPEED_WINDOW, collapse_ratio: float = COLLAPSE_RATIO):
+		"""
+		:param mirrors: URLs of the same file, best first
+		:param total: size of the file if it's already known
+		:param retries: how often every mirror may fail before giving up
+		"""
+		self.mirrors = mirrors
+		self.total = total
+		self.retries = retries
+		self.window = window
+		self.collapse_ratio = collapse_ratio
+		self.index = 0
+		self.position = 0
+		self.resp = None
+		self.failed: list[str] = []
+
+	@property
+	def url(self) -> str:
+		return self.mirrors[self.index % len(self.mirrors)]
+
+	def start(self) -> int | None:
+		"""
+		Opens the first mirror that works
+		:return: size of the file, None if the mirrors don't tell
+		"""
+		while self.resp is None:
+			try:
+				self.open()
+			except (URLError, OSError, http.client.HTTPException, ValueError) as e:
+				self.fail_over(e)
+		return self.total
+
+	def open(self):
+		req = request.Request(self.url)
+		if self.position > 0:
+			req.add_header("Range", f"bytes={self.position}-")
+
+		resp = urlopen(req, timeout=STALL_TIMEOUT if len(self.mirrors) > 1 else TIMEOUT)
+		if self.position > 0 and (resp.status != 206 or content_range_start(resp.headers.get("Content-Range")) != self.position):
+			resp.close()
+			raise ValueError(f"{self.url} can't continue at {self.position}")
+
+		if resp.status == 206:
+			total = content_range_total(resp.headers.get("Content-Range"))
+		else:
+			length = resp.headers.get("Content-Length")
+			total = int(length) if length else None
+		if self.total is not None and total is not None and total != self.total:
+			resp.close()
+			raise ValueError(f"{self.url} has {total} bytes instead of {self.total}, it isn't the same file")
+
+		self.total = self.total or total
+		self.resp = resp
+		self.peak = 0.0
+		self.window_started = time.monotonic()
+		self.window_bytes = 0
+
+	def fail_over(self, error: Exception):
+		self.close()
+		self.failed.append(self.url)
+		if len(self.failed) > self.retries * len(self.mirrors):
+			raise error
+
+		print(f"Mirror {self.url} failed at {self.position} ({error}), switching to the next one")
+		self.index += 1
+		if self.index % len(self.mirrors) == 0:
+			# Every mirror failed once in a row, give them a moment
+			time.sleep(RETRY_DELAY * (self.index // len(self.mirrors)))
+
+	def check_speed(self, amount: int):
+		self.window_bytes += amount
+		elapsed = time.monotonic() - self.window_started
+		if elapsed < self.window:
+			return
+
+		speed = self.window_bytes / elapsed
+		self.window_started = time.monotonic()
+		self.window_bytes = 0
+		if len(self.mirrors) > 1 and speed < self.collapse_ratio * self.peak:
+			raise SlowMirror(f"throughput fell to {speed / 1024:.0f} KB/s from {self.peak / 1024:.0f} KB/s")
+		self.peak = max(self.peak, speed)
+
+	def read(self, size: int = CHUNK_SIZE) -> bytes:
+		while True:
+			if self.total is not None and self.position >= self.total:
+				return b""
+
+			try:
+				if self.resp is None:
+					self.open()
+
+				data = self.resp.read(size)
+				if not data:
+					if self.total is None:
+						return b""
+					raise http.client.IncompleteRead(b"", self.total - self.position)
+
+				self.position += len(data)
+				try:
+					self.check_speed(len(data))
+				except SlowMirror as e:
+					# A slow mirror is better than none, so it's only left while others may still be tried
+					if len(self.failed) < self.retries * len(self.mirrors):
+						self.fail_over(e)
+				return data
+			except (URLError, OSError, http.client.HTTPException, ValueError) as e:
+				self.fail_over(e)
+
+	def close(self):
+		if self.resp is not None:
+			self.resp.close()
+			self.resp = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+
+def download_mirrored(mirrors: list[str], destination: Path, on_progress=None, chunk_size: int = CHUNK_SIZE,
+                      stream_hash: StreamHash | None = None, total: int | None = None) -> list[str]:
+	"""
+	Downloads a file from the best of several mirrors, see MirrorStream
+	:param mirrors: URLs of the same file, best first
+	:param on_progress: called with (done, total, bytes_per_second, eta_seconds)
+	:param stream_hash: fed with the whole file while it downloads
+	:param total: size of the file if it's already known
+	:return: mirrors that failed during the download
+	"""
+	partial = PartialFile(destination, mirrors[0])
+	partial.reset()
+	with MirrorStream(mirrors, total) as stream:
+		progress = Progress(stream.start(), on_progress)
+		with open(partial.path, "wb") as out_file:
+			while chunk := stream.read(chunk_size):
+				out_file.write(chunk)
+				progress.advance(len(chunk))
+				if stream_hash is not None:
+					stream_hash.update(chunk)
+
+	partial.finish()
+	progress.advance(0, force=True)
+	return stream.failed
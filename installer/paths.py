@@ -0,0 +1,28 @@
+import os
+import sys
+from pathlib import Path
+
+
+def default_folders() -> tuple:
+	"""
+	Creates the default save and projects folder of this platform
+	:return: (save_folder, project_folder)
+	"""
+	if sys.platform == "darwin":
+		save_folder = os.path.expanduser("~/Library/Application Support/SnackBag/CrystalStudio/")
+		Path(save_folder).mkdir(parents=True, exist_ok=True)
+
+		project_folder = os.path.expanduser("~/CrystalProjects/")
+		Path(project_folder).mkdir(parents=True, exist_ok=True)
+	elif sys.platform == "win32":
+		save_folder = Path(Path(os.getenv('APPDATA')) / Path("/SnackBag/CrystalStudio/"))
+		save_folder.mkdir(parents=True, exist_ok=True)
+
+		project_folder = os.path.expanduser("~/CrystalProjects/")
+		Path(project_folder).mkdir(parents=True, exist_ok=True)
+	else:
+		save_folder = Path("/")
+		project_folder = os.path.expanduser("~/CrystalProjects/")
+		Path(project_folder).mkdir(parents=True, exist_ok=True)
+
+	return save_folder, project_folder
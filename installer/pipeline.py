@@ -0,0 +1,118 @@
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+WORKERS = 4
+
+
+class Cancelled(Exception):
+	"""
+	Raised in a running stage once another stage failed, so the failure doesn't have to wait for it
+	"""
+	pass
+
+
+class Stage:
+	def __init__(self, name: str, func, after: list[str], text: str, weight: float):
+		self.name = name
+		self.func = func
+		self.after = after
+		self.text = text
+		self.weight = weight
+		self.fraction = 0.0
+
+
+class Pipeline:
+	"""
+	Runs stages on a thread pool as soon as every stage they depend on has finished, so independent work overlaps.
+	Progress is reported as (text, value) with value being the weighted percentage of finished work.
+	"""
+
+	def __init__(self, on_progress=None, workers: int = WORKERS, tracer=None):
+		"""
+		:param on_progress: called with (text, value)
+		:param workers: amount of stages that can run at the same time
+		:param tracer: records a span per stage, see installer.trace
+		"""
+		self.on_progress = on_progress
+		self.workers = workers
+		self.tracer = tracer
+		self.stages: dict[str, Stage] = {}
+		self.lock = threading.Lock()
+		# Set once a stage failed, running stages check it whenever they report progress
+		self.cancelled = threading.Event()
+
+	def add(self, name: str, func, after: list[str] | None = None, text: str = "", weight: float = 1):
+		"""
+		:param name: unique name of the stage
+		:param func: called without arguments when the stage runs
+		:param after: names of the stages that have to finish first
+		:param text: shown while the stage runs
+		:param weight: share of the progress bar the stage takes up, relative to the other stages
+		"""
+		for dependency in after or []:
+			if dependency not in self.stages:
+				raise ValueError(f"Stage {name} depends on unknown stage {dependency}")
+
+		self.stages[name] = Stage(name, func, after or [], text, weight)
+
+	def value(self) -> int:
+		total = sum(stage.weight for stage in self.stages.values())
+		done = sum(stage.weight * stage.fraction for stage in self.stages.values())
+		return int(100 * done / total) if total else 100
+
+	def report(self, name: str, fraction: float, text: str | None = None):
+		"""
+		Reports how far a running stage is, from 0 to 1. Raises Cancelled if another stage failed in the meantime.
+		"""
+		self.check_cancelled()
+		with self.lock:
+			stage = self.stages[name]
+			stage.fraction = min(max(fraction, 0.0), 1.0)
+			value = self.value()
+
+		if self.on_progress is not None:
+			self.on_progress(text or stage.text, value)
+
+	def check_cancelled(self):
+		if self.cancelled.is_set():
+			raise Cancelled("Another stage failed")
+
+	def run_stage(self, stage: Stage):
+		self.report(stage.name, 0.0)
+		if self.tracer is None:
+			stage.func()
+		else:
+			with self.tracer.span(stage.name):
+				stage.func()
+		self.report(stage.name, 1.0)
+
+	def run(self):
+		"""
+		Runs every stage and returns once all of them finished. If a stage fails, no new stages are started, the running
+		ones are cancelled at their next progress report and the exception is raised once they stopped.
+		"""
+		pending = dict(self.stages)
+		finished = set()
+		running = {}
+
+		with ThreadPoolExecutor(max_workers=self.workers) as pool:
+			while pending or running:
+				for name, stage in list(pending.items()):
+					if all(dependency in finished for dependency in stage.after):
+						print(f"Starting stage {name}")
+						running[pool.submit(self.run_stage, stage)] = name
+						del pending[name]
+
+				if not running:
+					raise ValueError(f"Stages {list(pending)} can never run, their dependencies are circular")
+
+				done, _ = wait(running, return_when=FIRST_COMPLETED)
+				for future in done:
+					name = running.pop(future)
+					if future.exception() is not None:
+						self.cancelled.set()
+						wait(running)
+						raise future.exception()
+
+					print(f"Finished stage {name}")
+					finished.add(name)
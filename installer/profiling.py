@@ -0,0 +1,122 @@
+import builtins
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+PROFILE_ENV = "CRYSTAL_PROFILE_STARTUP"
+PROFILE_FLAG = "--profile-startup"
+DEFAULT_REPORT = "startup_profile.json"
+
+
+class StartupProfiler:
+	"""
+	Records how long imports and named startup steps take and writes them to a JSON report.
+	Imports are timed by wrapping __import__, so it also works in the frozen app where python -X importtime can't be used.
+	"""
+
+	def __init__(self, report_path: Path):
+		self.report_path = Path(report_path)
+		self.started = time.perf_counter()
+		self.imports = []
+		self.spans = []
+		self.depth = 0
+		self.original_import = None
+
+	def install(self):
+		self.original_import = builtins.__import__
+
+		def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+			if level != 0 or name in sys.modules:
+				return self.original_import(name, globals, locals, fromlist, level)
+
+			self.depth += 1
+			started = time.perf_counter()
+			try:
+				return self.original_import(name, globals, locals, fromlist, level)
+			finally:
+				self.depth -= 1
+				self.imports.append({
+					"module": name,
+					"depth": self.depth,
+					"start_ms": (started - self.started) * 1000,
+					"duration_ms": (time.perf_counter() - started) * 1000
+				})
+
+		builtins.__import__ = timed_import
+
+	def uninstall(self):
+		if self.original_import is not None:
+			builtins.__import__ = self.original_import
+			self.original_import = None
+
+	@contextmanager
+	def span(self, name: str):
+		started = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.mark(name, started)
+
+	def mark(self, name: str, started: float | None = None):
+		"""
+		Records a step that started at started (perf_counter), or an instant event if started is None
+		"""
+		now = time.perf_counter()
+		started = now if started is None else started
+		self.spans.append({
+			"name": name,
+			"start_ms": (started - self.started) * 1000,
+			"duration_ms": (now - started) * 1000
+		})
+
+	def dump(self):
+		self.uninstall()
+		top_imports = sorted((i for i in self.imports if i["depth"] == 0), key=lambda i: -i["duration_ms"])
+		report = {
+			"total_ms": (time.perf_counter() - self.started) * 1000,
+			"spans": self.spans,
+			"top_level_imports": top_imports,
+			"imports": self.imports
+		}
+		with open(self.report_path, "w") as f:
+			json.dump(report, f, indent=4)
+
+		print(f"Wrote startup profile to {self.report_path}")
+		for span in self.spans:
+			print(f"  {span['name']}: {span['duration_ms']:.1f} ms")
+		for imp in top_imports[:10]:
+			print(f"  import {imp['module']}: {imp['duration_ms']:.1f} ms")
+
+
+class NullProfiler:
+	@contextmanager
+	def span(self, name: str):
+		yield
+
+	def mark(self, name: str, started: float | None = None):
+		pass
+
+	def dump(self):
+		pass
+
+
+def from_args(argv: list[str]) -> StartupProfiler | NullProfiler:
+	"""
+	Creates a profiler if --profile-startup[=path] is in argv or CRYSTAL_PROFILE_STARTUP is set (to the report path or 1)
+	"""
+	report = os.getenv(PROFILE_ENV)
+	for arg in argv:
+		if arg == PROFILE_FLAG:
+			report = DEFAULT_REPORT
+		elif arg.startswith(PROFILE_FLAG + "="):
+			report = arg.split("=", 1)[1]
+
+	if not report:
+		return NullProfiler()
+
+	profiler = StartupProfiler(Path(DEFAULT_REPORT if report == "1" else report))
+	profiler.install()
+	return profiler
@@ -0,0 +1,127 @@
+import json
+import re
+import sys
+from pathlib import Path
+
+from installer.metacache import MetadataCache
+from installer.urls import CHANNELS_URL
+
+DEFAULT_CHANNEL = "stable"
+# Releases of every channel listed are offered in that channel, so beta testers also get newer stable releases
+CHANNEL_INCLUDES = {"stable": ["stable"], "beta": ["beta", "stable"]}
+FORMATS = ["zip"]
+# Version of this installer, releases can require a minimum one
+INSTALLER_VERSION = 1
+
+
+class NoRelease(Exception):
+	"""
+	Raised when no release of a channel can be installed on this machine
+	"""
+	pass
+
+
+def archive_folder(url: str) -> str:
+	"""
+	Name of the folder inside a GitHub tag archive, e.g. .../empty-installation/archive/refs/tags/test-3.zip is
+	empty-installation-test-3
+	"""
+	parts = url.split("/")
+	if len(parts) != 9 or parts[5:8] != ["archive", "refs", "tags"]:
+		raise ValueError(f"{url} is not a GitHub tag archive, the release needs a folder")
+	return parts[4] + "-" + parts[8].rsplit(".", 1)[0]
+
+
+def version_key(version: str) -> tuple:
+	"""
+	Sort key for release versions, which aren't always numeric (e.g. test-3 < test-10)
+	"""
+	return tuple((0, int(part), "") if part.isdigit() else (1, 0, part) for part in re.split(r"[.+-]", version))
+
+
+class Release:
+	def __init__(self, version: str, url: str, folder: str | None = None, size: int | None = None,
+	             sha256: str | None = None, archive_format: str = "zip", platforms: list[str] | None = None,
+	             min_installer: int = 1, channel: str | None = None, mirrors: list[str] | None = None):
+		"""
+		:param folder: top-level folder inside the archive, derived from GitHub archive URLs if not given
+		:param platforms: values of sys.platform the release runs on, None for every platform
+		:param min_installer: oldest installer version that can install the release
+		:param mirrors: more URLs of the same archive
+		"""
+		self.version = version
+		self.url = url
+		self.folder = folder or archive_folder(url)
+		self.size = size
+		self.sha256 = sha256
+		self.archive_format = archive_format
+		self.platforms = platforms
+		self.min_installer = min_installer
+		self.channel = channel
+		self.mirrors = mirrors or []
+
+	@property
+	def urls(self) -> list[str]:
+		"""
+		:return: url and every mirror, without duplicates
+		"""
+		return list(dict.fromkeys([self.url] + self.mirrors))
+
+	@classmethod
+	def from_dict(cls, data: dict, channel: str | None = None) -> "Release":
+		return cls(
+			data["version"],
+			data["url"],
+			data.get("folder"),
+			data.get("size"),
+			data.get("sha256"),
+			data.get("format", "zip"),
+			data.get("platforms"),
+			data.get("min_installer", 1),
+			channel,
+			data.get("mirrors")
+		)
+
+	def is_compatible(self, platform: str = sys.platform, installer_version: int = INSTALLER_VERSION) -> bool:
+		return (self.platforms is None or platform in self.platforms) and self.min_installer <= installer_version \
+			and self.archive_format in FORMATS
+
+	def __repr__(self):
+		return f"Release({self.version!r}, {self.url!r}, channel={self.channel!r})"
+
+
+def pick_release(manifest: dict, channel: str = DEFAULT_CHANNEL, platform: str = sys.platform,
+                 installer_version: int = INSTALLER_VERSION) -> Release:
+	"""
+	:param manifest: contents of a channel manifest like installer/channels.json
+	:return: the newest release of channel that can be installed on platform
+	"""
+	if channel not in CHANNEL_INCLUDES:
+		raise ValueError(f"Unknown channel {channel}, use one of {list(CHANNEL_INCLUDES)}")
+
+	releases = []
+	for included in CHANNEL_INCLUDES[channel]:
+		for data in manifest.get("channels", {}).get(included, []):
+			try:
+				releases.append(Release.from_dict(data, included))
+			except (KeyError, ValueError) as e:
+				# A broken entry shouldn't keep the other releases from being installed
+				print(f"Skipping invalid release {data}: {e}")
+
+	compatible = [release for release in releases if release.is_compatible(platform, installer_version)]
+	if not compatible:
+		raise NoRelease(f"There is no {channel} release for {platform} that this installer can install, "
+		                f"please download the latest installer")
+	return max(compatible, key=lambda release: version_key(release.version))
+
+
+def resolve_release(save_folder: Path, channel: str = DEFAULT_CHANNEL, channels_url: str = CHANNELS_URL,
+                    installer_version: int = INSTALLER_VERSION) -> Release:
+	"""
+	Finds the release to install. The manifest is kept in the same metadata cache as the version check, which also
+	prefetches it, so this usually doesn't cost more than a 304.
+	"""
+	cache = MetadataCache.of_save_folder(save_folder)
+	release = pick_release(json.loads(cache.fetch(channels_url).decode()), channel, installer_version=installer_version)
+	print(f"Resolved {channel} release {release.version} ({release.url})")
+	return release
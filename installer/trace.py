@@ -0,0 +1,95 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# How much a new measurement counts when averaging stage durations over several installs
+SMOOTHING = 0.5
+
+
+class Tracer:
+	"""
+	Records timed spans and writes them in the Trace Event Format, so they can be opened in chrome://tracing or Perfetto
+	"""
+
+	def __init__(self):
+		self.started = time.perf_counter()
+		self.events = []
+		self.open_args: dict[str, dict] = {}
+		self.lock = threading.Lock()
+
+	@contextmanager
+	def span(self, name: str, category: str = "stage", **args):
+		"""
+		Times the body of the with block. More arguments can be added while it runs, see annotate.
+		"""
+		started = time.perf_counter()
+		with self.lock:
+			self.open_args[name] = args
+		try:
+			yield args
+		finally:
+			ended = time.perf_counter()
+			with self.lock:
+				self.open_args.pop(name, None)
+				self.events.append({
+					"name": name,
+					"cat": category,
+					"ph": "X",
+					"ts": (started - self.started) * 1_000_000,
+					"dur": (ended - started) * 1_000_000,
+					"pid": os.getpid(),
+					"tid": threading.get_ident(),
+					"args": args
+				})
+
+	def annotate(self, name: str, **args):
+		"""
+		Adds arguments to the running span name, or to the last finished one if it isn't running anymore
+		"""
+		with self.lock:
+			if name in self.open_args:
+				self.open_args[name].update(args)
+				return
+
+			for event in reversed(self.events):
+				if event["name"] == name:
+					event["args"].update(args)
+					return
+
+	def durations(self, category: str = "stage") -> dict[str, float]:
+		"""
+		:return: name -> seconds of every finished span in category
+		"""
+		with self.lock:
+			return {event["name"]: event["dur"] / 1_000_000 for event in self.events if event["cat"] == category}
+
+	def dump(self, path: Path):
+		Path(path).parent.mkdir(parents=True, exist_ok=True)
+		with self.lock:
+			trace = {"traceEvents": list(self.events), "displayTimeUnit": "ms"}
+		with open(path, "w") as f:
+			json.dump(trace, f, indent=4)
+		print(f"Wrote install trace to {path}")
+
+
+def load_stage_times(path: Path) -> dict[str, float]:
+	try:
+		with open(path, "r") as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return {}
+
+
+def dump_stage_times(path: Path, durations: dict[str, float]):
+	"""
+	Averages durations into the stage times stored at path, which are used as progress weights of the next install
+	"""
+	times = load_stage_times(path)
+	for name, seconds in durations.items():
+		times[name] = seconds if name not in times else SMOOTHING * seconds + (1 - SMOOTHING) * times[name]
+
+	with open(path, "w") as f:
+		json.dump(times, f, indent=4)
@@ -0,0 +1,155 @@
+import json
+import os
+from pathlib import Path
+
+from installer.fastcopy import move, preflight, reflink
+from installer.integrity import sha256_mapped
+
+STATE_NAME = "installed.json"
+
+
+def load_state(path: Path) -> dict:
+	try:
+		with open(path, "r") as f:
+			return json.load(f).get("files", {})
+	except (OSError, ValueError):
+		return {}
+
+
+def dump_state(path: Path, files: dict):
+	tmp_path = Path(path).with_suffix(".tmp")
+	with open(tmp_path, "w") as f:
+		json.dump({"files": files}, f, indent=4)
+	os.replace(tmp_path, path)
+
+
+def file_state(path: Path, digest: str) -> dict:
+	stat = path.stat()
+	return {"sha256": digest, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def is_unchanged(target: Path, digest: str, recorded: dict | None) -> bool:
+	if not target.is_file():
+		return False
+
+	# Trust the recorded hash as long as the file wasn't touched since, otherwise hash it again
+	stat = target.stat()
+	if recorded is not None and recorded["sha256"] == digest and recorded["size"] == stat.st_size \
+			and recorded["mtime_ns"] == stat.st_mtime_ns:
+		return True
+	return sha256_mapped(target) == digest
+
+
+def plan_update(files: dict[str, str], root: Path, state: dict) -> tuple[list[str], list[str], list[str]]:
+	"""
+	Compares the files of a release against what is installed in root
+	:param files: relative path -> SHA-256 of every file in the release
+	:param root: installation folder
+	:param state: what the previous install recorded, see load_state
+	:return: (added, modified, removed) relative paths
+	"""
+	added = []
+	modified = []
+	for name, digest in files.items():
+		target = root / name
+		if not target.exists():
+			added.append(name)
+		elif not is_unchanged(target, digest, state.get(name)):
+			modified.append(name)
+
+	removed = [name for name in state if name not in files and (root / name).exists()]
+	return added, modified, removed
+
+
+def apply_update(source: Path, root: Path, files: dict[str, str], state_path: Path) -> int:
+	"""
+	Brings root up to date with the release extracted in source, only writing added or modified files and deleting
+	the files that were removed from the release
+	:param source: folder the release was extracted to
+	:param root: installation folder
+	:param files: relative path -> SHA-256 of every file in the release
+	:param state_path: file keeping track of the installed files between updates
+	:return: amount of bytes written or deleted
+	"""
+	state = load_state(state_path)
+	added, modified, removed = plan_update(files, root, state)
+	print(f"Incremental update: {len(added)} added, {len(modified)} modified, {len(removed)} removed, "
+	      f"{len(files) - len(added) - len(modified)} unchanged")
+
+	changed = set(added) | set(modified)
+	preflight([(source / name, root / name) for name in changed])
+	touched = 0
+	new_state = {}
+	for name, digest in files.items():
+		target = root / name
+		if name in changed:
+			target.parent.mkdir(parents=True, exist_ok=True)
+			move(source / name, target)
+			touched += target.stat().st_size
+
+		new_state[name] = file_state(target, digest)
+
+	for name in removed:
+		target = root / name
+		touched += target.stat().st_size
+		os.remove(target)
+
+		# Clean up folders that are empty now
+		parent = target.parent
+		while parent != root and parent.is_dir() and not any(parent.iterdir()):
+			parent.rmdir()
+			parent = parent.parent
+
+	dump_state(state_path, new_state)
+	return touched
+
+
+def link_update(source: Path, previous: Path, destination: Path, files: dict[str, str], state_path: Path) -> int:
+	"""
+	Builds a new version of the install in destination. Files that are unchanged since the version in previous are
+	cloned from there, only added or modified files are moved over from the release extracted in source.
+	Clones are copy-on-write where the filesystem supports it (APFS, btrfs, XFS), so the versions stay independent.
+	Elsewhere unchanged files are hardlinked: both versions then share the file, and writing to it in place changes
+	the version that would be rolled back to as well.
+	:param source: folder the release was extracted to
+	:param previous: folder of the active version, whose files are tracked in state_path
+	:param destination: new, empty version folder
+	:param files: relative path -> SHA-256 of every file in the release
+	:param state_path: file keeping track of the installed files between updates
+	:return: amount of bytes written
+	"""
+	state = load_state(state_path)
+	changed = {name for name, digest in files.items() if not is_unchanged(previous / name, digest, state.get(name))}
+
+	preflight([(source / name, destination / name) for name in changed])
+	touched = 0
+	new_state = {}
+	# Stays on once a reflink failed, the versions all live on the same filesystem
+	hardlink = False
+	cloned = 0
+	for name, digest in files.items():
+		target = destination / name
+		target.parent.mkdir(parents=True, exist_ok=True)
+		linked = False
+		if name not in changed and not hardlink:
+			linked = reflink(previous / name, target)
+			hardlink = not linked
+			cloned += linked
+		if name not in changed and not linked:
+			try:
+				os.link(previous / name, target)
+				linked = True
+			except OSError as e:
+				# Not every filesystem supports hardlinks, the release has its own copy
+				print(f"Could not link {name} ({e}), moving it instead")
+
+		if not linked:
+			move(source / name, target)
+			touched += target.stat().st_size
+		new_state[name] = file_state(target, digest)
+
+	unchanged = len(files) - len(changed)
+	print(f"Incremental update: {len(changed)} changed, {cloned} cloned and {unchanged - cloned} linked from the "
+	      f"active version")
+	dump_state(state_path, new_state)
+	return touched
@@ -0,0 +1,6 @@
+CHECK_URL = "https://extras.snackbag.net/crystal/register/validate?username=%username%&password=%password%"
+REGISTER_URL = "https://extras.snackbag.net/crystal/register?username=%username%&password=%password%"
+LOGIN_URL = "http://extras.snackbag.net/crystal/login?username=%username%&password=%password%"
+USER_URL = "https://extras.snackbag.net/crystal/get/"
+INSTALLER_URL = "https://raw.githubusercontent.com/snackbag-net/CrystalStudio-Installer/main/installer/installer.json"
+CHANNELS_URL = "https://raw.githubusercontent.com/snackbag-net/CrystalStudio-Installer/main/installer/channels.json"
@@ -0,0 +1,239 @@
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+from installer.fastcopy import move_many
+from installer.update import link_update
+
+VERSIONS_FOLDER = "versions"
+CURRENT_NAME = "current"
+POINTER_NAME = "current.json"
+# Installed versions kept for rolling back, including the active one
+KEEP = 3
+
+
+def supports_symlinks(folder: Path) -> bool:
+	"""
+	Creating symlinks needs extra privileges on Windows, so check once before relying on them
+	"""
+	test_link = Path(folder) / ".symlink-test"
+	try:
+		if test_link.is_symlink():
+			os.remove(test_link)
+		os.symlink(".", test_link, target_is_directory=True)
+		os.remove(test_link)
+		return True
+	except (OSError, NotImplementedError):
+		return False
+
+
+def replace_link(link: Path, target: str, is_directory: bool):
+	"""
+	Points link at target in a single rename, so there is no moment where link doesn't exist
+	"""
+	tmp_link = link.with_name(link.name + ".tmp")
+	if tmp_link.is_symlink() or tmp_link.exists():
+		os.remove(tmp_link)
+	os.symlink(target, tmp_link, target_is_directory=is_directory)
+	os.replace(tmp_link, link)
+
+
+class VersionStore:
+	"""
+	Keeps every release in its own folder below <root>/versions. <root>/current is a symlink to the active one and
+	every content item in root links through it (e.g. root/app -> current/app), so activating a release or rolling back
+	is one atomic symlink swap no matter how big the install is. <root>/current.json records the history for rollbacks
+	and tells launchers which version is active.
+	"""
+
+	def __init__(self, root: Path, keep: int = KEEP):
+		self.root = Path(root)
+		self.keep = keep
+		self.versions_folder = self.root / VERSIONS_FOLDER
+		self.current_link = self.root / CURRENT_NAME
+		self.pointer_path = self.root / POINTER_NAME
+		self.versions_folder.mkdir(parents=True, exist_ok=True)
+		self.pointer = self.load_pointer()
+
+	def load_pointer(self) -> dict:
+		try:
+			with open(self.pointer_path, "r") as f:
+				pointer = json.load(f)
+		except (OSError, ValueError):
+			pointer = {}
+
+		pointer.setdefault("current", None)
+		pointer.setdefault("history", [])
+		return pointer
+
+	def dump_pointer(self):
+		tmp_path = self.pointer_path.with_suffix(".tmp")
+		with open(tmp_path, "w") as f:
+			json.dump(self.pointer, f, indent=4)
+		os.replace(tmp_path, self.pointer_path)
+
+	def current(self) -> str | None:
+		"""
+		:return: folder name of the active version
+		"""
+		if self.current_link.is_symlink():
+			return Path(os.readlink(self.current_link)).name
+		return self.pointer["current"]
+
+	def folder_name(self, version: str) -> str:
+		name = "".join(c if c.isalnum() or c in "-_." else "_" for c in version) or "release"
+		folder = name
+		i = 1
+		while (self.versions_folder / folder).exists():
+			i += 1
+			folder = f"{name}-{i}"
+		return folder
+
+	def active_folder(self) -> Path:
+		"""
+		:return: folder of the active version, root itself if content is still installed in place
+		"""
+		current = self.current()
+		if current is not None and (self.versions_folder / current).is_dir():
+			return self.versions_folder / current
+		return self.root
+
+	def install(self, version: str, source: Path, content: list[str], files: dict[str, str] | None = None,
+	            state_path: Path | None = None) -> str:
+		"""
+		Moves the content items of the release unpacked in source into a new version folder, without activating it
+		:param files: relative path -> SHA-256 of every file in the release. If given, files that didn't change since
+			the active version are cloned or hardlinked from it instead (see update.link_update).
+		:param state_path: file keeping track of the installed files, needed with files
+		:return: folder name of the new version
+		"""
+		folder = self.folder_name(version)
+		tmp_folder = self.versions_folder / f".{folder}.tmp"
+		shutil.rmtree(tmp_folder, ignore_errors=True)
+		tmp_folder.mkdir()
+		try:
+			if files is not None:
+				copied = link_update(Path(source), self.active_folder(), tmp_folder, files, state_path)
+				print(f"Moved {copied} bytes of changed files")
+			else:
+				copied = move_many([(Path(source) / cnt.rstrip("/"), tmp_folder / cnt.rstrip("/")) for cnt in content])
+				if copied:
+					print(f"Copied {copied} bytes from another filesystem")
+		except BaseException:
+			shutil.rmtree(tmp_folder, ignore_errors=True)
+			raise
+
+		# Only complete versions ever show up under their real name
+		os.replace(tmp_folder, self.versions_folder / folder)
+		self.pointer["history"].append({"version": version, "folder": folder, "installed_at": time.time(), "content": content})
+		self.dump_pointer()
+		return folder
+
+	def adopt(self, content: list[str]):
+		"""
+		Moves content that was installed in place (before versioned installs) into a version folder, so it can be
+		rolled back to and its items can become links
+		"""
+		legacy = [cnt for cnt in content if (self.root / cnt.rstrip("/")).exists()
+		          and not (self.root / cnt.rstrip("/")).is_symlink()]
+		if not legacy:
+			return
+
+		folder = self.folder_name("legacy")
+		(self.versions_folder / folder).mkdir()
+		for cnt in legacy:
+			name = cnt.rstrip("/")
+			(self.versions_folder / folder / name).parent.mkdir(parents=True, exist_ok=True)
+			os.replace(self.root / name, self.versions_folder / folder / name)
+		self.pointer["history"].append({"version": "legacy", "folder": folder, "installed_at": time.time(), "content": legacy})
+		self.dump_pointer()
+		print(f"Moved in-place install to {folder}")
+
+	def activate(self, folder: str):
+		"""
+		Makes folder the active version
+		"""
+		entry = self.entry(folder)
+		if entry is None or not (self.versions_folder / folder).is_dir():
+			raise ValueError(f"Version {folder} is not installed")
+		previous_entry = self.entry(self.current())
+
+		# Links of content items are stable, they go through current
+		for cnt in entry["content"]:
+			name = cnt.rstrip("/")
+			link = self.root / name
+			target = os.path.relpath(self.current_link / name, link.parent)
+			if not link.is_symlink() or os.readlink(link) != target:
+				link.parent.mkdir(parents=True, exist_ok=True)
+				replace_link(link, target, cnt.endswith("/"))
+
+		replace_link(self.current_link, os.path.join(VERSIONS_FOLDER, folder), True)
+
+		# Items the new version doesn't have anymore would link to nothing through current
+		names = {cnt.rstrip("/") for cnt in entry["content"]}
+		for cnt in previous_entry["content"] if previous_entry is not None else []:
+			link = self.root / cnt.rstrip("/")
+			if cnt.rstrip("/") not in names and link.is_symlink():
+				os.remove(link)
+		self.pointer["previous"] = self.pointer["current"] if self.pointer["current"] != folder else self.pointer.get("previous")
+		self.pointer["current"] = folder
+		self.dump_pointer()
+		print(f"Activated {entry['version']} ({folder})")
+
+	def discard(self, folder: str):
+		"""
+		Deletes a version that was installed but never activated
+		"""
+		if folder == self.current():
+			raise ValueError(f"Version {folder} is active")
+
+		shutil.rmtree(self.versions_folder / folder, ignore_errors=True)
+		self.pointer["history"] = [entry for entry in self.pointer["history"] if entry["folder"] != folder]
+		self.dump_pointer()
+		print(f"Discarded version {folder}")
+
+	def entry(self, folder: str) -> dict | None:
+		for entry in self.pointer["history"]:
+			if entry["folder"] == folder:
+				return entry
+		return None
+
+	def rollback(self) -> str:
+		"""
+		Activates the version that was active before the current one
+		:return: folder name of the now active version
+		"""
+		current = self.current()
+		previous = self.pointer.get("previous")
+		if previous is None or previous == current or not (self.versions_folder / previous).is_dir():
+			# Fall back to the newest other version that is still installed
+			candidates = [entry["folder"] for entry in self.pointer["history"]
+			              if entry["folder"] != current and (self.versions_folder / entry["folder"]).is_dir()]
+			if not candidates:
+				raise ValueError("There is no version to roll back to")
+			previous = candidates[-1]
+
+		self.activate(previous)
+		return previous
+
+	def prune(self) -> list[str]:
+		"""
+		Deletes the oldest versions until only keep are left, never the active or previous one
+		:return: folder names of the deleted versions
+		"""
+		protected = {self.current(), self.pointer.get("previous")}
+		history = self.pointer["history"]
+		removable = [entry for entry in history if entry["folder"] not in protected]
+		deleted = []
+		while len(history) - len(deleted) > self.keep and removable:
+			entry = removable.pop(0)
+			shutil.rmtree(self.versions_folder / entry["folder"], ignore_errors=True)
+			deleted.append(entry["folder"])
+
+		if deleted:
+			self.pointer["history"] = [entry for entry in history if entry["folder"] not in deleted]
+			self.dump_pointer()
+			print(f"Removed old versions {deleted}")
+		return deleted